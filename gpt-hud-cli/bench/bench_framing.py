@@ -0,0 +1,91 @@
+# bench_framing.py — MCP stdio framing cost on large tool results (page HTML, screenshots)
+# Compares the old `buf += chunk` + regex loop with mcp_client.FrameParser and reports
+# seconds per MB, which stays flat for a linear parser. Usage:
+#   python bench/bench_framing.py [--sizes 10,25,50] [--legacy-max 8]
+
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cli"))
+
+from mcp_client import FrameParser, encode_frame  # noqa: E402
+
+CONTENT_LEN_RE = re.compile(rb"Content-Length:\s*(\d+)\r\n\r\n", re.I)
+MB = 1024 * 1024
+
+
+def big_response(size_mb, framing):
+    blob = base64.b64encode(os.urandom(int(size_mb * MB * 3 / 4))).decode("ascii")
+    payload = {"jsonrpc": "2.0", "id": 1, "result": {"content": [{"type": "image", "data": blob, "mimeType": "image/png"}]}}
+    return encode_frame(payload, framing)
+
+
+def legacy(stream, read_size):
+    # the previous MCPClient._read_loop (4 KB reads, immutable bytes buffer)
+    buf = b""
+    out = []
+    for i in range(0, len(stream), read_size):
+        buf += stream[i:i + read_size]
+        while True:
+            m = CONTENT_LEN_RE.search(buf)
+            if not m:
+                break
+            header_end = m.end()
+            length = int(m.group(1))
+            if len(buf) - header_end < length:
+                break
+            out.append(buf[header_end:header_end + length])
+            buf = buf[header_end + length:]
+    return out
+
+
+def parser(stream, read_size):
+    p = FrameParser()
+    out = []
+    view = memoryview(stream)
+    for i in range(0, len(stream), read_size):
+        out.extend(p.feed(view[i:i + read_size]))
+    return out
+
+
+def timed(fn, stream, read_size):
+    t0 = time.perf_counter()
+    out = fn(stream, read_size)
+    dt = time.perf_counter() - t0
+    assert len(out) == 1 and json.loads(out[0])["id"] == 1
+    return dt
+
+
+def main():
+    ap = argparse.ArgumentParser("bench_framing")
+    ap.add_argument("--sizes", default="10,25,50", help="response sizes in MB")
+    ap.add_argument("--legacy-max", type=float, default=8, help="skip the quadratic legacy loop above this size (MB)")
+    args = ap.parse_args()
+
+    sizes = [float(x) for x in args.sizes.split(",") if x.strip()]
+    legacy_sizes = sorted({min(s, args.legacy_max) for s in sizes} | {args.legacy_max / 4, args.legacy_max / 2})
+    results = []
+    for size in sizes:
+        for framing in ("content-length", "ndjson"):
+            stream = big_response(size, framing)
+            dt = timed(parser, stream, 1 << 16)
+            results.append({"impl": "FrameParser", "framing": framing, "mb": size, "read": 1 << 16,
+                            "s": round(dt, 4), "s_per_mb": round(dt / size, 5)})
+    for size in legacy_sizes:
+        stream = big_response(size, "content-length")
+        dt = timed(legacy, stream, 4096)
+        results.append({"impl": "legacy", "framing": "content-length", "mb": size, "read": 4096,
+                        "s": round(dt, 4), "s_per_mb": round(dt / size, 5)})
+        dt = timed(parser, stream, 4096)
+        results.append({"impl": "FrameParser", "framing": "content-length", "mb": size, "read": 4096,
+                        "s": round(dt, 4), "s_per_mb": round(dt / size, 5)})
+    print(json.dumps({"bench": "mcp_framing", "results": results}))
+
+
+if __name__ == "__main__":
+    main()
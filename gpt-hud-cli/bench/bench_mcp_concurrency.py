@@ -0,0 +1,93 @@
+# bench_mcp_concurrency.py — hundreds of concurrent tool calls against the stub server
+# Drives AsyncMCPClient directly (asyncio.gather) and the blocking MCPClient wrapper from
+# a thread pool, checks every reply is matched to its own request, and prints JSON.
+#   python bench/bench_mcp_concurrency.py [--calls 500] [--delay-ms 20] [--framing ndjson]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "cli"))
+
+from mcp_client import AsyncMCPClient, MCPClient  # noqa: E402
+
+
+def server_cmd(delay_ms):
+    return [sys.executable, os.path.join(HERE, "stub_mcp_server.py"), "--delay-ms", str(delay_ms)]
+
+
+def check(i, res):
+    got = json.loads(res["content"][0]["text"])
+    assert got == i, f"reply mismatch: sent {i}, got {got}"
+
+
+async def run_async(calls, delay_ms, framing):
+    c = AsyncMCPClient(server_cmd(delay_ms), framing=framing)
+    await c.start()
+    try:
+        t0 = time.perf_counter()
+
+        async def one(i):
+            check(i, await c.call_tool("echo", {"value": i}))
+
+        await asyncio.gather(*(one(i) for i in range(calls)))
+        dt = time.perf_counter() - t0
+
+        # cancellation: a slow call cancelled mid-flight must not poison later calls
+        task = asyncio.ensure_future(c.call_tool("sleep", {"seconds": 5, "value": -1}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        check(7, await c.call_tool("echo", {"value": 7}))
+        return dt
+    finally:
+        await c.close()
+
+
+def run_sync(calls, delay_ms, framing, workers):
+    c = MCPClient(server_cmd(delay_ms), framing=framing)
+    c.start()
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, res in enumerate(pool.map(lambda i: c.call_tool("echo", {"value": i}), range(calls))):
+                check(i, res)
+        return time.perf_counter() - t0
+    finally:
+        c.close()
+
+
+def main():
+    ap = argparse.ArgumentParser("bench_mcp_concurrency")
+    ap.add_argument("--calls", type=int, default=500)
+    ap.add_argument("--delay-ms", type=float, default=20)
+    ap.add_argument("--workers", type=int, default=64, help="threads for the blocking client")
+    ap.add_argument("--framing", default="content-length", choices=["content-length", "ndjson"])
+    args = ap.parse_args()
+
+    t_async = asyncio.run(run_async(args.calls, args.delay_ms, args.framing))
+    t_sync = run_sync(args.calls, args.delay_ms, args.framing, args.workers)
+    serial = args.calls * args.delay_ms / 1000.0
+    print(json.dumps({
+        "bench": "mcp_concurrency",
+        "calls": args.calls,
+        "server_delay_ms": args.delay_ms,
+        "framing": args.framing,
+        "async_s": round(t_async, 3),
+        "sync_threads_s": round(t_sync, 3),
+        "serial_lower_bound_s": round(serial, 3),
+        "async_calls_per_s": round(args.calls / t_async, 1),
+        "sync_calls_per_s": round(args.calls / t_sync, 1),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# bench_sse.py — per-chunk overhead of the old iter_lines loop vs sse.ChatStreamDecoder
+# Replays a recorded-style 50k-delta stream through a real requests.Response so both
+# paths go through the same requests/urllib3 plumbing. The two paths run alternately
+# after warm-up rounds; times are medians and the speedup is the median of the per-round
+# ratios with its interquartile range, so a difference inside the noise shows as a
+# range straddling 1.0. Usage:
+#   python bench/bench_sse.py [--deltas 50000] [--chunk 0] [--rounds 21] [--warmup 2]
+
+import argparse
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cli"))
+
+import requests  # noqa: E402
+import sse  # noqa: E402
+from sse import ChatStreamDecoder, Delta, Usage, iter_chunks  # noqa: E402
+
+WORDS = ["the", " quick", " brown", " fox", " jumps", " over", " lazy", " dog", ",", ".", "\n", " ✓"]
+
+
+def record_stream(n):
+    # shaped like a real Azure/OpenAI stream: role chunk, n content deltas, finish, usage, DONE
+    base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini"}
+    parts = [b"data: " + json.dumps({**base, "choices": [{"index": 0, "delta": {"role": "assistant"}}]}).encode() + b"\n\n"]
+    for i in range(n):
+        ob = {**base, "choices": [{"index": 0, "delta": {"content": WORDS[i % len(WORDS)]}, "finish_reason": None}]}
+        parts.append(b"data: " + json.dumps(ob).encode() + b"\n\n")
+    parts.append(b"data: " + json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}).encode() + b"\n\n")
+    usage = {"prompt_tokens": 12, "completion_tokens": n, "total_tokens": n + 12}
+    parts.append(b"data: " + json.dumps({**base, "choices": [], "usage": usage}).encode() + b"\n\n")
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+class ChunkedRaw(io.BytesIO):
+    # urllib3-style raw body that delivers one HTTP chunk per SSE event, the way
+    # Azure/OpenAI actually flush a stream (requests then yields them one by one)
+    chunked = True
+
+    def stream(self, amt=None, decode_content=None):
+        data = self.getvalue()
+        pos = 0
+        while pos < len(data):
+            end = data.find(b"\n\n", pos) + 2
+            if end == 1:
+                end = len(data)
+            yield data[pos:end]
+            pos = end
+
+
+def fake_response(body, chunk):
+    r = requests.Response()
+    r.status_code = 200
+    r.raw = ChunkedRaw(body) if not chunk else io.BytesIO(body)
+    return r
+
+
+def legacy(body, chunk):
+    # the loop previously copy-pasted into repl() and run_once()
+    r = fake_response(body, chunk)
+    full, usage = [], None
+    for line in r.iter_lines(chunk_size=chunk or 512):
+        if not line:
+            continue
+        if line.startswith(b"data: "):
+            c = line[6:].decode("utf-8").strip()
+            if c == "[DONE]":
+                break
+            try:
+                ob = json.loads(c)
+                delta = ob["choices"][0]["delta"].get("content", "")
+                if delta:
+                    full.append(delta)
+                if "usage" in ob:
+                    usage = ob["usage"]
+            except Exception:
+                pass
+    return full, usage
+
+
+def decoder(body, chunk):
+    r = fake_response(body, chunk)
+    full, usage = [], None
+    dec = ChatStreamDecoder()
+    chunks = iter_chunks(r) if not chunk else r.iter_content(chunk_size=chunk)
+    for chunk_bytes in chunks:
+        for ev in dec.feed(chunk_bytes):
+            if type(ev) is Delta:
+                full.append(ev.text)
+            elif type(ev) is Usage:
+                usage = ev.usage
+        if dec.done:
+            break
+    return full, usage
+
+
+def best(fn, body, chunk, rounds):
+    times = []
+    out = None
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        out = fn(body, chunk)
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+
+def paired(fns, body, chunk, rounds, warmup):
+    # -> ([seconds per round] per fn, last output per fn). Rounds alternate the order
+    # (AB, BA, ...) so drift from CPU boost, other load or GC hits every path alike.
+    for _ in range(warmup):
+        for fn in fns:
+            fn(body, chunk)
+    times = [[] for _ in fns]
+    outs = [None] * len(fns)
+    for i in range(rounds):
+        order = range(len(fns)) if i % 2 == 0 else reversed(range(len(fns)))
+        for j in order:
+            gc.collect()
+            gc.disable()
+            try:
+                t0 = time.perf_counter()
+                outs[j] = fns[j](body, chunk)
+                times[j].append(time.perf_counter() - t0)
+            finally:
+                gc.enable()
+    return times, outs
+
+
+def main():
+    ap = argparse.ArgumentParser("bench_sse")
+    ap.add_argument("--deltas", type=int, default=50_000)
+    ap.add_argument("--chunk", type=int, default=0, help="fixed read size; 0 = one HTTP chunk per SSE event")
+    ap.add_argument("--rounds", type=int, default=21)
+    ap.add_argument("--warmup", type=int, default=2, help="untimed rounds per path first")
+    args = ap.parse_args()
+
+    body = record_stream(args.deltas)
+    chunks = sum(1 for _ in ChunkedRaw(body).stream()) if not args.chunk else (len(body) + args.chunk - 1) // args.chunk
+    (old, new), ((full_old, usage_old), (full_new, usage_new)) = paired(
+        (legacy, decoder), body, args.chunk, max(1, args.rounds), args.warmup)
+    assert full_old == full_new, "decoders disagree on content"
+    t_old, t_new = statistics.median(old), statistics.median(new)
+    ratios = sorted(o / n for o, n in zip(old, new))
+    q1, _, q3 = statistics.quantiles(ratios, n=4) if len(ratios) > 1 else ratios * 3
+    result = {
+        "bench": "sse_decode",
+        "deltas": args.deltas,
+        "json": "orjson" if sse.orjson is not None else "stdlib",
+        "bytes": len(body),
+        "chunks": chunks,
+        "legacy_s": round(t_old, 4),
+        "decoder_s": round(t_new, 4),
+        "legacy_us_per_chunk": round(t_old / chunks * 1e6, 2),
+        "decoder_us_per_chunk": round(t_new / chunks * 1e6, 2),
+        "rounds": len(ratios),
+        "speedup": round(statistics.median(ratios), 3),
+        "speedup_iqr": [round(q1, 3), round(q3, 3)],
+        "legacy_saw_usage": usage_old is not None,
+        "decoder_saw_usage": usage_new is not None,
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# mock_openai_server.py — local OpenAI-compatible chat endpoint for offline benchmarks
+# Serves POST .../chat/completions (OpenAI /v1 and Azure deployment paths alike), both
+# streaming (chunked SSE, one HTTP chunk per event, like the real services) and plain
+# JSON. The reply is min(--deltas, max_tokens) deltas of --delta-chars characters.
+#
+#   python bench/mock_openai_server.py [--port 0] [--deltas 200] [--delta-chars 4]
+#          [--tokens-per-s 0] [--ttft-ms 0] [--no-usage]
+#
+# Prints {"base_url": ...} on the first line, then serves until killed. Point the CLI at
+# it with PROVIDER=openai OPENAI_BASE_URL=<base_url> OPENAI_API_KEY=x.
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+
+
+class Config:
+    def __init__(self, deltas=200, delta_chars=4, tokens_per_s=0.0, ttft_ms=0.0, usage=True):
+        self.deltas = deltas
+        self.delta_chars = max(1, delta_chars)
+        self.tokens_per_s = tokens_per_s
+        self.ttft_ms = ttft_ms
+        self.usage = usage
+
+
+def reply_deltas(n, size):
+    # deterministic text; the first delta ends a line so line-buffered output shows it at once
+    text = " ".join(WORDS[i % len(WORDS)] for i in range(n * size // 5 + 2))
+    out = [WORDS[0] + "\n"]
+    pos = 0
+    while len(out) < n:
+        out.append(text[pos:pos + size])
+        pos += size
+    return out[:n]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # like real SSE servers; otherwise small events stall on delayed ACKs
+    cfg = Config()
+
+    def log_message(self, *a):
+        pass
+
+    def do_HEAD(self):  # transport.prewarm()
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(n) or b"{}")
+        if not self.path.split("?", 1)[0].endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": f"no route {self.path}"}})
+        cfg = self.cfg
+        count = max(1, min(cfg.deltas, int(body.get("max_tokens") or cfg.deltas)))
+        deltas = reply_deltas(count, cfg.delta_chars)
+        prompt = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt, "completion_tokens": count, "total_tokens": prompt + count}
+        model = body.get("model") or "mock"
+        if cfg.ttft_ms:
+            time.sleep(cfg.ttft_ms / 1000.0)
+        if not body.get("stream"):
+            msg = {"id": "chatcmpl-mock", "object": "chat.completion", "model": model,
+                   "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(deltas)}, "finish_reason": "stop"}]}
+            if cfg.usage:
+                msg["usage"] = usage
+            return self._json(200, msg)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0, "model": model}
+        interval = 1.0 / cfg.tokens_per_s if cfg.tokens_per_s else 0.0
+        self._event({**base, "choices": [{"index": 0, "delta": {"role": "assistant"}}]})
+        for d in deltas:
+            self._event({**base, "choices": [{"index": 0, "delta": {"content": d}, "finish_reason": None}]})
+            if interval:
+                time.sleep(interval)
+        self._event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if cfg.usage:
+            self._event({**base, "choices": [], "usage": usage})
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _event(self, ob):
+        self._chunk(b"data: " + json.dumps(ob).encode() + b"\n\n")
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _json(self, status, ob):
+        out = json.dumps(ob).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients dropping keep-alive sockets
+            super().handle_error(request, client_address)
+
+
+def start(port=0, **cfg):
+    # in-process server on a daemon thread -> (server, base_url); server.shutdown() to stop
+    handler = type("MockHandler", (Handler,), {"cfg": Config(**cfg)})
+    server = Server(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser("mock_openai_server")
+    ap.add_argument("--port", type=int, default=0, help="0 = pick a free port")
+    ap.add_argument("--deltas", type=int, default=200, help="deltas per reply (capped by the request's max_tokens)")
+    ap.add_argument("--delta-chars", type=int, default=4)
+    ap.add_argument("--tokens-per-s", type=float, default=0, help="stream rate; 0 = as fast as possible")
+    ap.add_argument("--ttft-ms", type=float, default=0, help="delay before the first byte")
+    ap.add_argument("--no-usage", action="store_true", help="omit the trailing usage chunk")
+    args = ap.parse_args()
+    server, url = start(args.port, deltas=args.deltas, delta_chars=args.delta_chars,
+                        tokens_per_s=args.tokens_per_s, ttft_ms=args.ttft_ms, usage=not args.no_usage)
+    print(json.dumps({"base_url": url}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
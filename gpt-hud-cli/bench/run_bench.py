@@ -0,0 +1,206 @@
+# run_bench.py — offline benchmark suite (no provider account, no Node/Playwright)
+# Starts mock_openai_server in-process and stub_mcp_server as a subprocess, runs every
+# scenario and prints one JSON document, so results can be diffed between commits.
+#
+#   python bench/run_bench.py [--only repl_turn,sse_decode] [--quick] [--out results.json]
+#
+# Scenarios:
+#   repl_turn        per-turn client overhead: context build + request + decode + render,
+#                    against a bare requests loop over the same mock stream
+#   run_once_ttft    `gpt_cli.py --prompt ... --stream` as a subprocess: spawn -> first
+#                    token on stdout, and spawn -> exit
+#   sse_decode       ChatStreamDecoder throughput on a recorded-style stream
+#   mcp_roundtrip    sequential tools/call latency through MCPClient to the stub server
+#   mcp_framing      FrameParser cost on large tool results
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLI = os.path.join(HERE, "..", "cli")
+sys.path.insert(0, CLI)
+sys.path.insert(0, HERE)
+
+import mock_openai_server  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+SCENARIOS = ["repl_turn", "run_once_ttft", "sse_decode", "mcp_roundtrip", "mcp_framing"]
+
+
+def quantiles(samples, scale=1000.0, unit="ms"):
+    s = sorted(samples)
+    return {f"p{q}_{unit}": round(percentile(s, q / 100) * scale, 3) for q in (50, 95, 99)}
+
+
+def provider_env(base_url):
+    return {"PROVIDER": "openai", "OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "bench",
+            "OPENAI_MODEL": "mock", "MCP_CMD": "", "MCP_ENDPOINTS": "", "RESPONSE_CACHE": "", "METRICS_FILE": ""}
+
+
+# ---- scenarios ------------------------------------------------------------------
+def repl_turn(args):
+    turns = 20 if args.quick else 100
+    server, url = mock_openai_server.start(deltas=200, delta_chars=4)
+    os.environ.update(provider_env(url))
+    import requests
+    from rich.console import Console
+    import gpt_cli
+    from context import ContextBuilder, TokenCounter
+    from metrics import RequestTimer
+    from render import LiveRenderer
+
+    try:
+        # baseline: the bare minimum any client has to do for the same stream
+        s = requests.Session()
+        body = {"model": "mock", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 512, "stream": True}
+        raw = []
+        for _ in range(turns):
+            t0 = time.perf_counter()
+            with s.post(url + "/chat/completions", json=body, stream=True) as r:
+                for _ in r.iter_content(None):
+                    pass
+            raw.append(time.perf_counter() - t0)
+        s.close()
+
+        ctx = ContextBuilder(TokenCounter("mock"), window=128000, reserve=512)
+        history, full_turn = [], []
+        sink = Console(file=io.StringIO(), force_terminal=False, width=120)
+        for i in range(turns):
+            t0 = time.perf_counter()
+            msgs, _ = ctx.build("You are terse.", {}, history, f"question {i}")
+            timer = RequestTimer()
+            r = gpt_cli.send_chat(msgs, stream=True, temperature=0.2, max_tokens=512)
+            timer.got_headers()
+            with LiveRenderer(sink, title="Assistant:", fps=15) as view:
+                full, usage, _, _ = gpt_cli.stream_reply(r, view.push, timer)
+            gpt_cli.summarize_usage(usage, "mock")
+            history += [{"role": "user", "content": f"question {i}"}, {"role": "assistant", "content": "".join(full)}]
+            full_turn.append(time.perf_counter() - t0)
+        gpt_cli.transport.close()
+    finally:
+        server.shutdown()
+    raw_q, turn_q = quantiles(raw), quantiles(full_turn)
+    return {
+        "turns": turns, "deltas_per_turn": 200,
+        "baseline": raw_q, "turn": turn_q,
+        "overhead_p50_ms": round(turn_q["p50_ms"] - raw_q["p50_ms"], 3),
+    }
+
+
+def run_once_ttft(args):
+    runs = 3 if args.quick else 10
+    server, url = mock_openai_server.start(deltas=200, delta_chars=4)
+    env = {**os.environ, **provider_env(url), "PYTHONUNBUFFERED": "1", "COLUMNS": "120"}
+    first, total = [], []
+    try:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            p = subprocess.Popen([sys.executable, os.path.join(CLI, "gpt_cli.py"), "--prompt", "bench", "--stream"],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+            t_first = None
+            for line in p.stdout:
+                if t_first is None and mock_openai_server.WORDS[0].encode() in line:
+                    t_first = time.perf_counter() - t0
+            p.wait()
+            total.append(time.perf_counter() - t0)
+            if t_first is None or p.returncode:
+                raise RuntimeError(f"run_once failed (exit {p.returncode})")
+            first.append(t_first)
+    finally:
+        server.shutdown()
+    return {"runs": runs, "spawn_to_first_token": quantiles(first), "spawn_to_exit": quantiles(total)}
+
+
+def sse_decode(args):
+    import bench_sse
+    n = 10_000 if args.quick else 50_000
+    body = bench_sse.record_stream(n)
+    out = {"deltas": n, "bytes": len(body), "json": "orjson" if bench_sse.sse.orjson is not None else "stdlib"}
+    for label, chunk in (("per_event_chunks", 0), ("coalesced_16k", 16384)):
+        dt, (full, usage) = bench_sse.best(bench_sse.decoder, body, chunk, 3)
+        assert len(full) == n and usage is not None
+        out[label] = {"s": round(dt, 4), "events_per_s": round(n / dt), "mb_per_s": round(len(body) / dt / 1e6, 1)}
+    return out
+
+
+def mcp_roundtrip(args):
+    from mcp_client import MCPClient
+    calls = 200 if args.quick else 1000
+    cmd = [sys.executable, os.path.join(HERE, "stub_mcp_server.py")]
+    out = {"calls": calls}
+    for framing in ("content-length", "ndjson"):
+        c = MCPClient(cmd, framing=framing)
+        t0 = time.perf_counter()
+        c.start()
+        startup = time.perf_counter() - t0
+        try:
+            samples = []
+            for i in range(calls):
+                t0 = time.perf_counter()
+                c.call_tool("echo", {"value": i})
+                samples.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            c.list_tools()
+            cached = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            c.list_tools(refresh=True)
+            fresh = time.perf_counter() - t0
+        finally:
+            c.close()
+        out[framing] = {"startup_ms": round(startup * 1000, 2), "call": quantiles(samples, 1e6, "us"),
+                        "list_tools_cached_us": round(cached * 1e6, 1), "list_tools_fresh_us": round(fresh * 1e6, 1)}
+    return out
+
+
+def mcp_framing(args):
+    import bench_framing
+    sizes = [5.0] if args.quick else [10.0, 25.0]
+    out = []
+    for size in sizes:
+        for framing in ("content-length", "ndjson"):
+            stream = bench_framing.big_response(size, framing)
+            dt = bench_framing.timed(bench_framing.parser, stream, 1 << 16)
+            out.append({"framing": framing, "mb": size, "s": round(dt, 4), "s_per_mb": round(dt / size, 5)})
+    return out
+
+
+# ---- driver ---------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser("run_bench")
+    ap.add_argument("--only", help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    ap.add_argument("--quick", action="store_true", help="fewer iterations (smoke run)")
+    ap.add_argument("--out", help="also write the JSON document to this file")
+    args = ap.parse_args()
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else SCENARIOS
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        ap.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    doc = {"suite": "gpt-hud-bench", "python": platform.python_version(), "platform": platform.platform(),
+           "quick": args.quick, "results": {}}
+    status = 0
+    for name in names:
+        t0 = time.perf_counter()
+        try:
+            res = globals()[name](args)
+        except Exception as e:
+            res, status = {"error": f"{type(e).__name__}: {e}"}, 1
+        doc["results"][name] = res if isinstance(res, dict) else {"results": res}
+        doc["results"][name]["wall_s"] = round(time.perf_counter() - t0, 3)
+    text = json.dumps(doc, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
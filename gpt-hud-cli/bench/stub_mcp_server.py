@@ -0,0 +1,109 @@
+# stub_mcp_server.py — tiny MCP stdio server for benchmarks (no Node/Playwright needed)
+# Speaks Content-Length or newline-delimited framing (mirrors whatever the client sends)
+# and handles requests concurrently, so replies can come back out of order.
+#
+# Tools:
+#   echo   {value}              -> returns value as text
+#   sleep  {seconds, value}     -> waits, then echoes (honours notifications/cancelled)
+#   blob   {bytes}              -> returns a text block of the requested size
+#
+#   python bench/stub_mcp_server.py [--delay-ms 0]
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cli"))
+
+from mcp_client import FrameParser, encode_frame  # noqa: E402
+
+TOOLS = [
+    {"name": "echo", "description": "Echo a value", "inputSchema": {"type": "object", "properties": {"value": {}}}},
+    {"name": "sleep", "description": "Sleep then echo", "inputSchema": {"type": "object", "properties": {"seconds": {"type": "number"}, "value": {}}}},
+    {"name": "blob", "description": "Return N bytes of text", "inputSchema": {"type": "object", "properties": {"bytes": {"type": "integer"}}}},
+]
+
+
+class Stub:
+    def __init__(self, delay):
+        self.delay = delay
+        self.framing = "content-length"
+        self.wlock = threading.Lock()
+        self.cancelled = set()
+
+    def send(self, payload):
+        data = encode_frame(payload, self.framing)
+        with self.wlock:
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+    def reply(self, rid, result=None, error=None):
+        msg = {"jsonrpc": "2.0", "id": rid}
+        if error is not None:
+            msg["error"] = error
+        else:
+            msg["result"] = result
+        self.send(msg)
+
+    def handle(self, msg):
+        rid, method, params = msg.get("id"), msg.get("method"), msg.get("params") or {}
+        if self.delay:
+            time.sleep(self.delay)
+        if method == "initialize":
+            return self.reply(rid, {
+                "protocolVersion": params.get("protocolVersion", "2024-11-05"),
+                "capabilities": {"tools": {"listChanged": True}},
+                "serverInfo": {"name": "stub-mcp", "version": "0.1.0"},
+            })
+        if method == "ping":
+            return self.reply(rid, {})
+        if method == "tools/list":
+            return self.reply(rid, {"tools": TOOLS})
+        if method == "tools/call":
+            name, args = params.get("name"), params.get("arguments") or {}
+            if name == "echo":
+                return self.reply(rid, {"content": [{"type": "text", "text": json.dumps(args.get("value"))}]})
+            if name == "sleep":
+                end = time.monotonic() + float(args.get("seconds", 0))
+                while time.monotonic() < end:
+                    if rid in self.cancelled:
+                        return  # cancelled requests get no reply, per spec
+                    time.sleep(0.01)
+                return self.reply(rid, {"content": [{"type": "text", "text": json.dumps(args.get("value"))}]})
+            if name == "blob":
+                return self.reply(rid, {"content": [{"type": "text", "text": "x" * int(args.get("bytes", 0))}]})
+            return self.reply(rid, {"content": [{"type": "text", "text": f"Unknown tool {name}"}], "isError": True})
+        return self.reply(rid, error={"code": -32601, "message": f"Method not found: {method}"})
+
+    def serve(self):
+        parser = FrameParser()
+        stdin = sys.stdin.buffer.raw
+        first = True
+        while True:
+            chunk = stdin.read(1 << 16)
+            if not chunk:
+                break
+            if first:
+                self.framing = "ndjson" if chunk.lstrip()[:1] in (b"{", b"[") else "content-length"
+                first = False
+            for body in parser.feed(chunk):
+                msg = json.loads(body)
+                if "id" not in msg:
+                    if msg.get("method") == "notifications/cancelled":
+                        self.cancelled.add((msg.get("params") or {}).get("requestId"))
+                    continue
+                threading.Thread(target=self.handle, args=(msg,), daemon=True).start()
+
+
+def main():
+    ap = argparse.ArgumentParser("stub_mcp_server")
+    ap.add_argument("--delay-ms", type=float, default=0, help="artificial per-request latency")
+    args = ap.parse_args()
+    Stub(args.delay_ms / 1000.0).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# cache.py — opt-in, content-addressed on-disk cache for complete chat responses
+# Entries are keyed on sha256(messages, model, temperature, max_tokens) and store the
+# delta sequence, so hits can be replayed through the normal streaming path.
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gpt-hud", "responses")
+
+
+def cache_key(messages, model, temperature, max_tokens):
+    blob = json.dumps(
+        {"messages": messages, "model": model, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class CachedResponse:
+    # requests.Response stand-in that replays a cached entry
+    status_code = 200
+    headers = {}
+
+    def __init__(self, entry):
+        self.entry = entry
+
+    def _events(self):
+        for d in self.entry.get("deltas") or []:
+            yield {"choices": [{"index": 0, "delta": {"content": d}}]}
+        if self.entry.get("usage"):
+            yield {"choices": [], "usage": self.entry["usage"]}
+
+    def iter_lines(self):
+        for ob in self._events():
+            yield b"data: " + json.dumps(ob, ensure_ascii=False).encode("utf-8")
+            yield b""
+        yield b"data: [DONE]"
+
+    def iter_content(self, chunk_size=None):
+        for line in self.iter_lines():
+            yield line + b"\n"
+
+    def json(self):
+        return {
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.entry.get("content", "")}}],
+            "usage": self.entry.get("usage"),
+        }
+
+    @property
+    def text(self):
+        return json.dumps(self.json())
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ResponseCache:
+    def __init__(self, root=None, max_bytes=200 * 1024 * 1024, max_age=7 * 86400):
+        self.root = os.path.expanduser(root or DEFAULT_DIR)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._puts = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if self.max_age and time.time() - st.st_mtime > self.max_age:
+            self._unlink(path)
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except Exception:
+            self._unlink(path)
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, content, usage=None, deltas=None, model=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "content": content,
+            "deltas": deltas if deltas is not None else [content],
+            "usage": usage,
+            "model": model,
+            "created": time.time(),
+        }
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)  # atomic: concurrent readers never see a half-written entry
+        self._puts += 1
+        if self._puts % 64 == 1:  # a full scan per put would be quadratic in --batch runs
+            self.evict()
+
+    def evict(self):
+        now = time.time()
+        files = []
+        total = 0
+        for sub in _scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for e in _scandir(sub.path):
+                if not e.name.endswith(".json"):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                if self.max_age and now - st.st_mtime > self.max_age:
+                    self._unlink(e.path)
+                    continue
+                files.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        files.sort()  # least recently used first
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _scandir(path):
+    try:
+        return list(os.scandir(path))
+    except OSError:
+        return []
@@ -0,0 +1,170 @@
+# context.py — token-budgeted prompt assembly for the REPL
+# Counts tokens locally (tiktoken when installed, otherwise a fast estimator), caches
+# the count per message text, and packs system prompt + attachments + history into
+# the model's context window minus a reserve for the reply. Oldest turns go first,
+# in large blocks: the history start only moves when the budget is exceeded, so the
+# prompt prefix stays byte-identical between trims and provider prompt caches hit.
+
+import re
+
+try:
+    import tiktoken  # optional: exact counts for OpenAI models
+except Exception:
+    tiktoken = None
+
+MSG_OVERHEAD = 4  # role/separator tokens per chat message
+REPLY_PRIMING = 3  # every reply is primed with <|start|>assistant<|message|>
+
+# words, numbers, single punctuation marks; long words split roughly like BPE does
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def _estimate(text):
+    n = 0
+    for m in _PIECES.finditer(text):
+        k = m.end() - m.start()
+        n += 1 if k <= 6 else (k + 5) // 6
+    return n
+
+
+class TokenCounter:
+    def __init__(self, model=None, max_entries=4096):
+        self._encode = None
+        if tiktoken is not None:
+            try:
+                enc = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+            except Exception:
+                enc = tiktoken.get_encoding("cl100k_base")
+            self._encode = enc.encode
+        self.kind = "tiktoken" if self._encode else "estimate"
+        self._cache = {}  # text -> tokens; texts are immutable so the key is the text itself
+        self.max_entries = max_entries
+
+    def text(self, s):
+        n = self._cache.get(s)
+        if n is None:
+            n = len(self._encode(s, disallowed_special=())) if self._encode else _estimate(s)
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            self._cache[s] = n
+        return n
+
+    def message(self, msg):
+        content = msg.get("content")
+        if not isinstance(content, str):
+            content = "" if content is None else str(content)
+        n = MSG_OVERHEAD + self.text(content)
+        for tc in msg.get("tool_calls") or ():  # an assistant turn that asked for tools
+            fn = tc.get("function") or {}
+            n += self.text(fn.get("name") or "") + self.text(fn.get("arguments") or "")
+        return n
+
+    def messages(self, msgs):
+        return REPLY_PRIMING + sum(self.message(m) for m in msgs)
+
+
+class ContextBuilder:
+    # window: model context size in tokens; reserve: tokens kept free for the reply;
+    # trim_to: when over budget, drop old turns until the prompt fits in this fraction
+    # of the budget, leaving headroom for the next turns to append without re-trimming
+    def __init__(self, counter, window=128000, reserve=512, trim_to=0.6):
+        self.counter = counter
+        self.window = int(window)
+        self.reserve = int(reserve)
+        self.trim_to = min(1.0, max(0.1, float(trim_to)))
+        self._start = 0  # index of the first history message still sent
+        self.trims = 0
+
+    def reset(self):
+        self._start = 0
+
+    @property
+    def budget(self):
+        return max(0, self.window - self.reserve)
+
+    def build(self, system, attachments, history, user_text, chunks=(), chunk_budget=0):
+        # -> (messages, info). history is a flat list of alternating user/assistant
+        # messages; whole turns are dropped from the front, a block at a time.
+        # chunks: retrieved snippets, best first, packed into chunk_budget tokens and
+        # sent just before the user message so they never disturb the cached prefix.
+        count = self.counter.message
+        head = []
+        if system:
+            head.append({"role": "system", "content": system})
+        paths = list(attachments)
+        files = [{"role": "user", "content": f"[file:{p}]\n{c}"} for p, c in attachments.items()]
+        tail = {"role": "user", "content": user_text}
+
+        picked, chunk_tokens = [], 0
+        for c in chunks:
+            n = self.counter.text(c)
+            if chunk_tokens + n > chunk_budget:
+                continue  # a smaller, lower-ranked chunk may still fit
+            picked.append(c)
+            chunk_tokens += n
+        retrieved = [{"role": "user", "content": "[retrieved from attached files]\n\n" + "\n\n".join(picked)}] if picked else []
+
+        fixed = REPLY_PRIMING + sum(count(m) for m in head) + count(tail) + sum(count(m) for m in retrieved)
+        file_tokens = [count(m) for m in files]
+        hist_tokens = [count(m) for m in history]
+        used = fixed + sum(file_tokens) + sum(hist_tokens)
+
+        if self._start > len(history):
+            self._start = 0  # history was cleared
+        start = self._start
+        used -= sum(hist_tokens[:start])
+        if used > self.budget:
+            target = int(self.budget * self.trim_to)
+            while used > target and start < len(history):
+                step = 2 if start + 1 < len(history) else 1  # a turn = user + assistant
+                used -= sum(hist_tokens[start:start + step])
+                start += step
+            self.trims += 1
+        self._start = start
+
+        dropped_files = []
+        while used > self.budget and files:  # last resort: oldest attachment first
+            dropped_files.append(paths.pop(0))
+            files.pop(0)
+            used -= file_tokens.pop(0)
+
+        info = {
+            "prompt_tokens": used,
+            "budget": self.budget,
+            "dropped_turns": (start + 1) // 2,
+            "dropped_files": dropped_files,
+            "chunks": len(picked),
+            "chunk_tokens": chunk_tokens,
+            "over": used > self.budget,
+        }
+        return head + files + history[start:] + retrieved + [tail], info
+
+    def fit(self, messages, texts, extra=0):
+        # texts about to be appended to `messages` (tool results) -> the texts cut so the
+        # whole prompt stays within the budget. Each gets an equal share of the room left,
+        # shortest first, so a short result passes its unused share on to the longer ones.
+        # extra: tokens the request spends outside the messages (tool specs).
+        count = self.counter.text
+        free = self.budget - self.counter.messages(messages) - extra - MSG_OVERHEAD * len(texts)
+        out = list(texts)
+        left = len(texts)
+        for i in sorted(range(len(texts)), key=lambda i: count(texts[i])):
+            share = max(0, free // left)
+            n = count(out[i])
+            if n > share:
+                out[i] = _cut(out[i], n, share, count)
+                n = count(out[i])
+            free -= n
+            left -= 1
+        return out
+
+
+CUT_NOTE = "\n… [truncated to fit the context window]"
+
+
+def _cut(text, tokens, share, count):
+    # longest prefix (by a char-per-token estimate, then shrunk) + note within `share`
+    keep = int(len(text) * max(0, share - count(CUT_NOTE)) / max(1, tokens))
+    while keep > 0 and count(text[:keep] + CUT_NOTE) > share:
+        keep = int(keep * 0.9)
+    return text[:keep] + CUT_NOTE
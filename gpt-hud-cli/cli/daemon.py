@@ -0,0 +1,140 @@
+# daemon.py — opt-in warm background process on a Unix socket
+# Keeps everything that is slow to set up (imports, .env, pooled HTTP connections,
+# the MCP child process, caches, rate-limit and breaker state) alive between
+# invocations. Protocol: the client sends one JSON line {"op": ..., ...}; the daemon
+# answers with JSON lines ({"delta": ...}, ..., then {"done": true} or {"error": ...}).
+# Each connection gets its own thread; the daemon exits after `idle` seconds with no
+# connected clients.
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+DEFAULT_SOCKET = os.path.join(
+    os.getenv("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gpt-hud"), "gpt-hud.sock"
+)
+
+
+def socket_path(path=None):
+    return os.path.expanduser(path or os.getenv("DAEMON_SOCKET") or DEFAULT_SOCKET)
+
+
+def is_running(path):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        d = self.server.daemon
+        d.enter()
+        try:
+            line = self.rfile.readline(16 * 1024 * 1024)
+            if not line.strip():
+                return
+            try:
+                req = json.loads(line)
+            except ValueError as e:
+                return self.emit({"error": f"bad request: {e}"})
+            op = req.get("op")
+            d.served += 1  # liveness probes (connect + close) are not counted
+            fn = d.handlers.get(op)
+            if fn is None:
+                return self.emit({"error": f"unknown op {op!r}", "ops": sorted(d.handlers)})
+            try:
+                result = fn(req, self.emit)
+                self.emit({"done": True, **(result or {})})
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client went away mid-stream; the handler already stopped
+            except Exception as e:
+                self.emit({"error": f"{type(e).__name__}: {e}"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            d.leave()
+
+    def emit(self, ob):
+        self.wfile.write((json.dumps(ob, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemon:
+    def __init__(self, path=None, handlers=None, idle=900.0):
+        self.path = socket_path(path)
+        self.handlers = dict(handlers or {})
+        self.handlers.setdefault("ping", lambda req, emit: {"pid": os.getpid()})
+        self.handlers.setdefault("stop", self._stop)
+        self.handlers.setdefault("status", self._status)
+        self.idle = idle
+        self.started = time.time()
+        self.served = 0
+        self._active = 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def enter(self):
+        with self._lock:
+            self._active += 1
+            self._last = time.monotonic()
+
+    def leave(self):
+        with self._lock:
+            self._active -= 1
+            self._last = time.monotonic()
+
+    def _status(self, req, emit):
+        with self._lock:
+            return {"pid": os.getpid(), "uptime_s": round(time.time() - self.started, 1),
+                    "clients": self._active - 1, "served": self.served, "idle_timeout_s": self.idle}
+
+    def _stop(self, req, emit):
+        threading.Thread(target=self._server.shutdown, daemon=True).start()
+        return {"stopping": True}
+
+    def _watch_idle(self):
+        while True:
+            time.sleep(min(5.0, max(0.5, self.idle / 4)))
+            with self._lock:
+                idle = self._active == 0 and time.monotonic() - self._last >= self.idle
+            if idle:
+                self._server.shutdown()
+                return
+
+    def serve(self, on_ready=None):
+        if is_running(self.path):
+            raise RuntimeError(f"daemon already listening on {self.path}")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket from a crashed daemon
+        old_umask = os.umask(0o177)  # socket is 0600: same-user clients only
+        try:
+            self._server = _Server(self.path, _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon = self
+        if self.idle > 0:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+        if on_ready:
+            on_ready(self.path)
+        try:
+            self._server.serve_forever(poll_interval=0.5)
+        finally:
+            self._server.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,342 @@
+# endpoints.py — ordered chat endpoints with per-endpoint circuit breakers
+# Failover: connect errors, timeouts, 429 and 5xx trip the endpoint's breaker and the
+# request moves on to the next healthy endpoint. Hedging (streams only): if the first
+# endpoint has not produced a token after `hedge_after` seconds, the next one is asked
+# too; the first to produce a token wins and the other response is closed.
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+
+import requests
+
+from sse import ChatStreamDecoder, Delta, Done, ToolCallDelta, iter_chunks
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class Endpoint:
+    def __init__(self, name, provider, base, key, model=None, deployment=None, api_version=None):
+        self.name = name
+        self.provider = provider  # "azure" | "openai"
+        self.base = base
+        self.key = key
+        self.model = model
+        self.deployment = deployment
+        self.api_version = api_version
+        self.breaker = CircuitBreaker()
+
+    @classmethod
+    def from_dict(cls, d, n):
+        provider = (d.get("provider") or "openai").lower()
+        key = d.get("api_key") or os.getenv(d.get("api_key_env") or "") or None
+        if provider == "azure":
+            return cls(d.get("name") or f"azure-{n}", "azure", d.get("endpoint"), key,
+                       model=d.get("model") or d.get("deployment"), deployment=d.get("deployment"),
+                       api_version=d.get("api_version") or "2025-01-01-preview")
+        return cls(d.get("name") or f"openai-{n}", "openai", d.get("base_url") or "https://api.openai.com/v1",
+                   key, model=d.get("model") or "gpt-4o-mini")
+
+    @property
+    def ok(self):
+        if self.provider == "azure":
+            return bool(self.base and self.key and self.deployment)
+        return bool(self.base and self.key and self.model)
+
+    @property
+    def ident(self):
+        # what the request is actually routed to (deployment on Azure), used in cache keys
+        return f"azure:{self.deployment}" if self.provider == "azure" else f"openai:{self.base}:{self.model}"
+
+    def request(self, messages, stream=True, temperature=0.2, max_tokens=512, tools=None):
+        # -> (url, headers, body); tools: OpenAI function-tool specs offered to the model
+        if not self.ok:
+            raise RuntimeError(f"{self.name}: {'Azure' if self.provider == 'azure' else 'OpenAI'} env incomplete.")
+        body = {"messages": messages, "temperature": temperature, "max_tokens": max_tokens, "stream": stream}
+        if tools:
+            body["tools"] = tools
+        if self.provider == "azure":
+            url = f"{self.base}/openai/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
+            return url, {"api-key": self.key, "Content-Type": "application/json"}, body
+        url = f"{self.base.rstrip('/')}/chat/completions"
+        return url, {"Authorization": f"Bearer {self.key}", "Content-Type": "application/json"}, {"model": self.model, **body}
+
+
+class CircuitBreaker:
+    # closed -> (failures in a row) -> open -> (cooldown) -> half-open: one trial request
+    def __init__(self, failures=3, cooldown=30.0):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.latency = None  # EWMA of time to response headers
+        self.ttft = None  # EWMA of time to first token (streams)
+        self.ok_count = 0
+        self.fail_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def available(self):
+        # would allow() let a request through? (without claiming the half-open trial)
+        with self._lock:
+            st = self.state
+            return st == "closed" or (st == "half-open" and not self.trial)
+
+    def allow(self):
+        # claims the half-open trial slot: call only right before actually sending
+        with self._lock:
+            st = self.state
+            if st == "closed":
+                return True
+            if st == "half-open" and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def success(self, latency=None):
+        with self._lock:
+            self.failures, self.opened_at, self.trial = 0, None, False
+            self.ok_count += 1
+            if latency is not None:
+                self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+
+    def release(self):
+        # the trial ended without a verdict on the endpoint (e.g. a 4xx for a bad request)
+        with self._lock:
+            self.trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self.fail_count += 1
+            self.trial = False
+            if self.failures >= self.max_failures or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+    def observe_ttft(self, ttft):
+        if ttft is not None:
+            self.ttft = ttft if self.ttft is None else 0.7 * self.ttft + 0.3 * ttft
+
+
+def _abort(r):
+    # close a response that another thread may be blocked reading: close() alone waits for
+    # that read to return, so shut the socket down first (wakes it) and close off-thread
+    conn = getattr(getattr(r, "raw", None), "_connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    threading.Thread(target=r.close, daemon=True).start()
+
+
+class _Prefetched:
+    # response whose first chunks were already read while racing a hedge; replays them
+    def __init__(self, r, head, rest):
+        self._r = r
+        self._head = head
+        self._rest = rest
+        self.status_code = r.status_code
+        self.headers = r.headers
+
+    def iter_content(self, chunk_size=None):
+        yield from self._head
+        yield from self._rest
+
+    def raise_for_status(self):
+        self._r.raise_for_status()
+
+    def close(self):
+        self._r.close()
+
+
+class EndpointPool:
+    def __init__(self, endpoints, failures=3, cooldown=30.0, hedge_after=0.0):
+        self.endpoints = [e for e in endpoints if e is not None]
+        for e in self.endpoints:
+            e.breaker.max_failures, e.breaker.cooldown = failures, cooldown
+        self.hedge_after = hedge_after
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_config(cls, spec, fallback, **kw):
+        # spec: JSON list (inline, or a path to a .json file) of endpoint dicts; empty ->
+        # just the single endpoint described by the legacy PROVIDER env vars
+        spec = (spec or "").strip()
+        if not spec:
+            return cls([fallback], **kw)
+        if not spec.startswith("["):
+            with open(os.path.expanduser(spec), "r", encoding="utf-8") as f:
+                spec = f.read()
+        return cls([Endpoint.from_dict(d, n) for n, d in enumerate(json.loads(spec), 1)], **kw)
+
+    @property
+    def primary(self):
+        for e in self.endpoints:
+            if e.ok:
+                return e
+        return self.endpoints[0] if self.endpoints else None
+
+    @property
+    def ok(self):
+        return any(e.ok for e in self.endpoints)
+
+    def candidates(self):
+        # healthy endpoints in configured order; if every breaker is open, try them anyway.
+        # Side-effect free: a half-open endpoint's trial is claimed in _attempt().
+        ready = [e for e in self.endpoints if e.ok]
+        allowed = [e for e in ready if e.breaker.available()]
+        return allowed or ready
+
+    def _others_available(self, ep):
+        return any(e.ok and e is not ep and e.breaker.available() for e in self.endpoints)
+
+    def send(self, post, messages, stream=True, temperature=0.2, max_tokens=512, hedge_after=None, tools=None):
+        # post(url, headers, json, stream) -> response. Returns the response with an
+        # `endpoint` attribute naming who served it.
+        eps = self.candidates()
+        if not eps:
+            raise RuntimeError("No chat endpoint configured.")
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        if stream and hedge_after and len(eps) > 1:
+            return self._hedged(eps, post, messages, temperature, max_tokens, hedge_after, tools)
+        last = None
+        for ep in eps:
+            try:
+                r = self._attempt(ep, post, messages, stream, temperature, max_tokens, tools)
+            except _Retryable as e:
+                last = e.cause
+                continue
+            r.endpoint = ep
+            return r
+        raise last
+
+    def _attempt(self, ep, post, messages, stream, temperature, max_tokens, tools=None):
+        url, headers, body = ep.request(messages, stream, temperature, max_tokens, tools)
+        br = ep.breaker
+        if br.state == "half-open" and not br.allow() and self._others_available(ep):
+            # the trial is already in flight: go elsewhere. With nowhere else to go (the
+            # candidates() fallback, e.g. a single endpoint) the request is sent anyway.
+            raise _Retryable(RuntimeError(f"{ep.name}: circuit half-open, trial request already in flight"))
+        t0 = time.perf_counter()
+        try:
+            r = post(url, headers=headers, json=body, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            br.failure()
+            raise _Retryable(e)
+        except BaseException:
+            br.release()
+            raise
+        if r.status_code in RETRY_STATUS:
+            br.failure()
+            try:
+                r.raise_for_status()
+            except requests.HTTPError as e:
+                raise _Retryable(e)
+            finally:
+                r.close()
+        if r.status_code >= 400:
+            br.release()
+            r.raise_for_status()  # other 4xx: the request is wrong, not the endpoint
+        br.success(time.perf_counter() - t0)
+        return r
+
+    def _hedged(self, eps, post, messages, temperature, max_tokens, hedge_after, tools=None):
+        results = queue.Queue()
+        lock = threading.Lock()
+        state = {"winner": None}
+        open_ = {}  # ep -> response still racing for its first token
+
+        def run(ep):
+            try:
+                r = self._attempt(ep, post, messages, True, temperature, max_tokens, tools)
+                with lock:
+                    if state["winner"] is not None:
+                        r.close()
+                        return
+                    open_[ep] = r
+                # read until the first token (or the end) so "first" means first token
+                dec, head, chunks = ChatStreamDecoder(), [], iter_chunks(r)
+                for chunk in chunks:
+                    head.append(chunk)
+                    if state["winner"] is not None or any(type(ev) in (Delta, ToolCallDelta, Done) for ev in dec.feed(chunk)):
+                        break
+                with lock:
+                    lost = state["winner"] is not None
+                    open_.pop(ep, None)
+                if lost:
+                    r.close()
+                    return
+                results.put((ep, _Prefetched(r, head, chunks), None))
+            except _Retryable as e:
+                results.put((ep, None, e.cause))
+            except Exception as e:
+                if state["winner"] is None:  # a loser closed under us is not an error
+                    results.put((ep, None, e))
+
+        def launch(ep):
+            threading.Thread(target=run, args=(ep,), daemon=True).start()
+
+        launch(eps[0])
+        nxt, inflight, hedged, last = 1, 1, False, None
+        while True:
+            wait_for = hedge_after if (not hedged and nxt < len(eps)) else None
+            try:
+                ep, r, err = results.get(timeout=wait_for)
+            except queue.Empty:
+                hedged = True
+                self.hedges += 1
+                launch(eps[nxt])
+                nxt += 1
+                inflight += 1
+                continue
+            inflight -= 1
+            if err is None:
+                with lock:
+                    state["winner"] = ep
+                    losers = [o for e, o in open_.items() if e is not ep]
+                    open_.clear()
+                for other in losers:
+                    _abort(other)  # cancel: don't wait for the loser's first byte
+                if ep is not eps[0]:
+                    self.hedge_wins += 1
+                while True:  # a loser that finished in the same instant
+                    try:
+                        _, other, _ = results.get_nowait()
+                    except queue.Empty:
+                        break
+                    if other is not None:
+                        other.close()
+                r.endpoint = ep
+                return r
+            last = err
+            if isinstance(err, requests.HTTPError) and err.response is not None and err.response.status_code not in RETRY_STATUS:
+                raise err
+            if inflight == 0:
+                if nxt >= len(eps):
+                    raise last
+                launch(eps[nxt])  # plain failover
+                nxt += 1
+                inflight += 1
+
+    def status(self):
+        # -> [(name, state, latency, ttft, ok, failed)] for the HUD
+        return [(e.name, e.breaker.state, e.breaker.latency, e.breaker.ttft, e.breaker.ok_count, e.breaker.fail_count)
+                for e in self.endpoints]
+
+
+class _Retryable(Exception):
+    def __init__(self, cause):
+        super().__init__(str(cause))
+        self.cause = cause
@@ -2,13 +2,18 @@
 # Paste this whole file. Requires: requests, python-dotenv, rich
 # Your tiny MCP client must be in the same folder as mcp_client.py
 
+import time
+_boot = [time.perf_counter()]  # startup phase marks, replayed into --trace
+
 import os
 import sys
 import json
-import time
 import uuid
 import argparse
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeout
 
 import requests
 from rich.console import Console
@@ -17,6 +22,8 @@ from rich.columns import Columns
 from rich.table import Table
 from rich.prompt import Prompt
 from rich.rule import Rule
+from rich.live import Live
+_boot.append(time.perf_counter())
 
 # Load .env if available
 try:
@@ -24,9 +31,25 @@ try:
     load_dotenv()
 except Exception:
     pass
+_boot.append(time.perf_counter())
 
 # ---- MCP tiny client --------------------------------------------------------
-from mcp_client import MCPClient  # make sure file is named mcp_client.py
+from mcp_pool import MCPPool  # supervised MCPClient processes (mcp_client.py)
+from transport import Transport, aiter_thread
+from cache import ResponseCache, CachedResponse, cache_key
+from sse import ChatStreamDecoder, Delta, Usage, Finish, StreamError, ToolCallDelta, ToolCallAssembler, iter_chunks
+from render import LiveRenderer
+from context import TokenCounter, ContextBuilder
+from retrieval import ChunkIndex
+from metrics import RequestTimer, MetricsSink, fmt_ms
+from endpoints import Endpoint, EndpointPool
+from ratelimit import RateLimiter, retry_after, backoff
+from daemon import Daemon
+from sessions import SessionStore
+from tools import ToolSet, run_calls
+import spans
+from spans import span
+_boot.append(time.perf_counter())
 
 console = Console()
 
@@ -44,9 +67,102 @@ OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+# Failover across several endpoints (optional): JSON list inline or a path to a .json file,
+# e.g. [{"name":"east","provider":"azure","endpoint":"https://…","api_key_env":"AZURE_EAST_KEY",
+#        "deployment":"gpt-5-chat"}, {"name":"oai","provider":"openai","api_key_env":"OPENAI_API_KEY"}]
+# Unset -> the single endpoint described by PROVIDER and the variables above.
+ENDPOINTS = os.getenv("ENDPOINTS")
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "3"))  # consecutive failures before an endpoint is skipped
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))  # seconds before a tripped endpoint is retried
+HEDGE_AFTER_MS = float(os.getenv("HEDGE_AFTER_MS", "0"))  # ask the next endpoint too if no token by then; 0 = off
+
+
+def legacy_endpoint():
+    if PROVIDER == "azure":
+        return Endpoint("azure", "azure", AZURE_ENDPOINT, AZURE_KEY, model="gpt-5-chat-latest",
+                        deployment=AZURE_DEPLOY, api_version=AZURE_VER)
+    if PROVIDER == "openai":
+        return Endpoint("openai", "openai", OPENAI_BASE_URL, OPENAI_API_KEY, model=OPENAI_MODEL)
+    return None
+
+
+endpoints = EndpointPool.from_config(
+    ENDPOINTS, legacy_endpoint(),
+    failures=CIRCUIT_FAILURES, cooldown=CIRCUIT_COOLDOWN, hedge_after=HEDGE_AFTER_MS / 1000.0,
+)
+
+# Client-side rate limiting from x-ratelimit-* headers, shared across processes via a state file
+RATE_LIMIT = (os.getenv("RATE_LIMIT") or "1").strip().lower() not in ("0", "false", "no")
+RATE_LIMIT_STATE = os.getenv("RATE_LIMIT_STATE") or None  # default ~/.cache/gpt-hud/ratelimit.json
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "0"))  # static limits for endpoints without headers
+RATE_LIMIT_TPM = int(os.getenv("RATE_LIMIT_TPM", "0"))
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))  # 429 retries before failing over / giving up
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))  # longest wait for admission or Retry-After
+
 # MCP
 MCP_CMD = os.getenv("MCP_CMD")  # e.g. "node mcp-playwright-server.mjs"
+MCP_SERVERS = os.getenv("MCP_SERVERS")  # JSON list (inline or a .json path) of servers; overrides MCP_CMD
+MCP_REPLICAS = int(os.getenv("MCP_REPLICAS", "1"))  # processes for MCP_CMD
+MCP_CONCURRENCY = int(os.getenv("MCP_CONCURRENCY", "4"))  # calls in flight per process before calls queue
+MCP_RESTART_MAX_BACKOFF = float(os.getenv("MCP_RESTART_MAX_BACKOFF", "30"))  # seconds between restarts of a crash-looping server
+MCP_FRAMING = (os.getenv("MCP_FRAMING") or "content-length").strip().lower()  # or "ndjson"
 MCP_ENDPOINTS = [e.strip() for e in (os.getenv("MCP_ENDPOINTS") or "").split(",") if e.strip()]
+MCP_START_TIMEOUT = float(os.getenv("MCP_START_TIMEOUT", "15"))  # initialize handshake
+MCP_HEALTH_TIMEOUT = float(os.getenv("MCP_HEALTH_TIMEOUT", "2"))
+MCP_HEALTH_TTL = float(os.getenv("MCP_HEALTH_TTL", "10"))  # seconds a probe result is reused
+BANNER_WAIT = float(os.getenv("BANNER_WAIT", "3"))  # max seconds the banner waits to fill in MCP status
+
+# Model-driven tool calls (REPL): the MCP server's tools are offered to the model
+TOOLS = (os.getenv("TOOLS") or "1").strip().lower() not in ("0", "false", "no")
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))  # seconds per call
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "20000"))  # longer results are truncated
+TOOL_MAX_ROUNDS = int(os.getenv("TOOL_MAX_ROUNDS", "6"))  # model -> tools -> model round-trips per turn
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))  # calls from one reply run in parallel
+
+# HTTP transport (pooled keep-alive; HTTP/2 needs `pip install "httpx[http2]"`)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "90"))  # idle seconds; 0 disables keep-alive
+HTTP2 = (os.getenv("HTTP2") or "").strip().lower() in ("1", "true", "yes")
+
+transport = Transport(pool_size=HTTP_POOL_SIZE, keepalive=HTTP_KEEPALIVE, http2=HTTP2)
+token_counter = TokenCounter(endpoints.primary.model if endpoints.primary else None)
+limiter = RateLimiter(RATE_LIMIT_STATE, rpm=RATE_LIMIT_RPM, tpm=RATE_LIMIT_TPM, max_wait=RATE_LIMIT_MAX_WAIT) if RATE_LIMIT else None
+
+# Response cache (opt-in via --cache or RESPONSE_CACHE=1)
+RESPONSE_CACHE = (os.getenv("RESPONSE_CACHE") or "").strip().lower() in ("1", "true", "yes")
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR") or None
+RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "200"))
+RESPONSE_CACHE_MAX_AGE = float(os.getenv("RESPONSE_CACHE_MAX_AGE", str(7 * 86400)))  # seconds
+
+# Streaming output
+RENDER_FPS = float(os.getenv("RENDER_FPS", "15"))
+RENDER_MARKDOWN = (os.getenv("RENDER_MARKDOWN") or "").strip().lower() in ("1", "true", "yes")
+
+# Prompt budget (REPL): context window in tokens; the reply's max_tokens is kept free
+CONTEXT_WINDOW = int(os.getenv("CONTEXT_WINDOW", "128000"))
+CONTEXT_TRIM_TO = float(os.getenv("CONTEXT_TRIM_TO", "0.6"))  # fraction of the budget kept after a trim
+
+# Indexed attachments: directories and files over MAX_ATTACH_BYTES are chunked into a
+# local BM25 index and only the best-matching chunks are sent each turn
+RETRIEVAL_INDEX = os.getenv("RETRIEVAL_INDEX") or None  # sqlite path; default ~/.cache/gpt-hud/index.sqlite
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_TOKENS = int(os.getenv("RETRIEVAL_TOKENS", "4000"))  # per-turn budget for retrieved chunks
+RETRIEVAL_INCLUDE_HIDDEN = (os.getenv("RETRIEVAL_INCLUDE_HIDDEN") or "").strip().lower() in ("1", "true", "yes")  # dotfiles, key files, .gitignore'd paths
+
+# Latency metrics export: *.prom -> Prometheus textfile at exit, anything else -> JSONL per request
+METRICS_FILE = os.getenv("METRICS_FILE") or None
+
+# Warm background daemon (`gpt_cli.py --daemon`; thin client: cli/hud.py)
+DAEMON_SOCKET = os.getenv("DAEMON_SOCKET") or None  # default $XDG_RUNTIME_DIR/gpt-hud.sock
+DAEMON_IDLE = float(os.getenv("DAEMON_IDLE", "900"))  # exit after this many seconds without clients; 0 = never
+
+# REPL session logs (append-only; resume with --resume <id|last>, list with --sessions)
+SESSIONS = (os.getenv("SESSIONS") or "1").strip().lower() not in ("0", "false", "no")
+SESSION_DIR = os.getenv("SESSION_DIR") or None  # default ~/.cache/gpt-hud/sessions
+
+# Phase tracing / profiling (or pass --trace PATH / --profile [N])
+TRACE_FILE = os.getenv("TRACE_FILE") or None  # Chrome trace-event JSON, written at exit
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "25"))  # hot functions listed by --profile
 
 # Pricing (USD per 1k tokens). Keep zeros if you don’t want estimates.
 PRICES = {
@@ -60,20 +176,59 @@ TEXT_EXTS = {
     ".txt", ".md", ".py", ".json", ".yaml", ".yml", ".toml", ".js", ".ts",
     ".html", ".css", ".sh", ".bat", ".ps1", ".sql", ".csv"
 }
+_boot.append(time.perf_counter())
 
 # ---- Small utils ------------------------------------------------------------
 def provider_ok():
-    if PROVIDER == "azure":
-        return bool(AZURE_ENDPOINT and AZURE_KEY and AZURE_DEPLOY)
-    if PROVIDER == "openai":
-        return bool(OPENAI_BASE_URL and OPENAI_API_KEY and OPENAI_MODEL)
-    return False
+    return endpoints.ok
+
+
+def default_model():
+    ep = endpoints.primary
+    return ep.model if ep is not None else OPENAI_MODEL
+
+
+def served_by(model, r):
+    # Model column label: which endpoint answered, once there is more than one
+    ep = getattr(r, "endpoint", None)
+    model = model or (ep.model if ep is not None else None) or "unknown"
+    return f"{model} @ {ep.name}" if ep is not None and len(endpoints.endpoints) > 1 else model
+
+
+def label_model(label):
+    # Model column label ("model @ endpoint", "model (cache)") -> the model name PRICES uses
+    if not label:
+        return label
+    if label.endswith(" (cache)"):
+        label = label[:-len(" (cache)")]
+    return label.split(" @ ", 1)[0]
 
 
 def provider_panel():
-    name = "Azure OpenAI" if PROVIDER == "azure" else "OpenAI-compatible"
     ok = provider_ok()
-    txt = f"[b]provider[/b]={PROVIDER}\n[b]auth[/b]={'set' if ok else 'missing'}"
+    if len(endpoints.endpoints) <= 1:
+        name = "Azure OpenAI" if PROVIDER == "azure" else "OpenAI-compatible"
+        txt = f"[b]provider[/b]={PROVIDER}\n[b]auth[/b]={'set' if ok else 'missing'}"
+    else:
+        name = f"Endpoints ({len(endpoints.endpoints)})"
+        txt = ""
+    colors = {"closed": "green", "half-open": "yellow", "open": "red"}
+    lines = []
+    for ep, (n, state, lat, ttft, good, bad) in zip(endpoints.endpoints, endpoints.status()):
+        if not ep.ok:
+            lines.append(f"{n} : [red]not configured[/red]")
+        elif good or bad or len(endpoints.endpoints) > 1:
+            line = f"{n} : [{colors[state]}]{state}[/{colors[state]}]"
+            if lat is not None:
+                line += f" • hdrs {fmt_ms(lat)}"
+            if ttft is not None:
+                line += f" • ttft {fmt_ms(ttft)}"
+            if good or bad:
+                line += f" • {good} ok / {bad} failed"
+            lines.append(line)
+    if endpoints.hedges:
+        lines.append(f"hedged {endpoints.hedges}× • won {endpoints.hedge_wins}")
+    txt = "\n".join(x for x in [txt] + lines if x)
     return Panel(
         txt,
         title=f"{name} " + ("[green]OK" if ok else "[red]NOT READY"),
@@ -81,30 +236,92 @@ def provider_panel():
     )
 
 
-def mcp_panel(message=None):
-    if message:
-        return Panel(message, title="MCP", border_style="green")
-    if not MCP_ENDPOINTS:
+def mcp_pool():
+    # MCP_SERVERS, else MCP_CMD with MCP_REPLICAS processes; None if neither is set
+    return MCPPool.from_config(MCP_SERVERS, MCP_CMD, replicas=MCP_REPLICAS, framing=MCP_FRAMING,
+                               concurrency=MCP_CONCURRENCY, max_backoff=MCP_RESTART_MAX_BACKOFF,
+                               start_timeout=MCP_START_TIMEOUT)
+
+
+def background(fn, *args):
+    # run fn on a daemon thread and hand back a Future for its result
+    fut = Future()
+
+    def run():
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return fut
+
+
+_health_cache = {}  # endpoint -> (monotonic ts, ok, label)
+
+
+def _probe(ep):
+    try:
+        r = requests.get(ep, timeout=MCP_HEALTH_TIMEOUT)
+        ok = 200 <= r.status_code < 300
+        label = "OK" if ok else f"FAIL({r.status_code})"
+    except Exception:
+        ok, label = False, "FAIL"
+    _health_cache[ep] = (time.monotonic(), ok, label)
+    return ok, label
+
+
+def probe_health(ep):
+    # cached for MCP_HEALTH_TTL seconds, so /status doesn't re-probe dead endpoints
+    hit = _health_cache.get(ep)
+    if hit and time.monotonic() - hit[0] < MCP_HEALTH_TTL:
+        fut = Future()
+        fut.set_result(hit[1:])
+        return fut
+    return background(_probe, ep)
+
+
+def mcp_panel(message=None, health=None, servers=None):
+    # health: {endpoint: (ok, label) or None while the probe is still running}
+    # servers: MCPPool.stats() rows
+    health = health or {}
+    rows = [message] if message else []
+    healthy = True
+    for st in servers or ():
+        line = (f"{st['name']}: {st['up']}/{st['replicas']} up • queue {st['queue']} • in flight {st['inflight']}"
+                f" • {st['calls']} calls")
+        if st["calls"]:
+            line += f" • p50 {fmt_ms(st['p50'])} / p95 {fmt_ms(st['p95'])}"
+        if st["errors"]:
+            line += f" • {st['errors']} failed"
+        if st["restarts"]:
+            line += f" • {st['restarts']} restart(s)"
+        if st["up"] < st["replicas"]:
+            healthy = False
+            if st["error"]:
+                line += f"\n  [dim]{st['error'][:120]}[/dim]"
+        rows.append(line)
+    if not MCP_ENDPOINTS and not message:
         return Panel(
             "No MCP health URLs configured.\nSet MCP_ENDPOINTS=http://127.0.0.1:8931/health",
             title="MCP",
             border_style="yellow",
         )
-    rows = []
-    healthy = True
     for ep in MCP_ENDPOINTS:
-        try:
-            r = requests.get(ep, timeout=2)
-            ok = 200 <= r.status_code < 300
-            rows.append(f"{ep} : {'OK' if ok else f'FAIL({r.status_code})'}")
-            healthy &= ok
-        except Exception:
-            rows.append(f"{ep} : FAIL")
-            healthy = False
+        res = health.get(ep)
+        if res is None:
+            rows.append(f"{ep} : [dim]probing…[/dim]")
+            continue
+        ok, label = res
+        rows.append(f"{ep} : {label}")
+        healthy &= ok
     return Panel("\n".join(rows), title="MCP", border_style="green" if healthy else "yellow")
 
 
-def banner(mcp_message=None):
+def banner(mcp_state=None):
+    # Renders immediately; the MCP panel fills in as the spawn handshake and the
+    # (concurrent, cached) health probes finish, for at most BANNER_WAIT seconds.
+    mcp_state = mcp_state or {}
     console.print(Rule("[bold cyan]GPT-HUD[/bold cyan]"))
     console.print(
         Panel.fit(
@@ -113,7 +330,31 @@ def banner(mcp_message=None):
             border_style="cyan",
         )
     )
-    console.print(Columns([provider_panel(), mcp_panel(mcp_message)]))
+    probes = {ep: probe_health(ep) for ep in MCP_ENDPOINTS}
+    pending = [f for f in probes.values() if not f.done()]
+    if mcp_state.get("ready") is not None and not mcp_state["ready"].done():
+        pending.append(mcp_state["ready"])
+
+    def render():
+        health = {ep: (f.result() if f.done() else None) for ep, f in probes.items()}
+        pool = mcp_state.get("pool")
+        servers = pool.stats() if pool is not None and mcp_state["ready"].done() else None
+        return Columns([provider_panel(), mcp_panel(mcp_state.get("msg"), health, servers)])
+
+    if not pending:
+        console.print(render())
+        return
+    if not console.is_terminal:
+        wait(pending, timeout=BANNER_WAIT)
+        console.print(render())
+        return
+    with Live(render(), console=console, auto_refresh=False) as live:
+        try:
+            for _ in as_completed(pending, timeout=BANNER_WAIT):
+                live.update(render(), refresh=True)
+        except FutureTimeout:
+            pass
+        live.update(render(), refresh=True)
 
 
 def estimate_cost(model, pt, ct, cached):
@@ -138,58 +379,246 @@ def summarize_usage(usage_obj, fallback_model):
     return (model, pt, ct, cached, total)
 
 
+def cache_savings(model, pt, ct, cached, cost):
+    # what the row would have cost without provider prompt caching (or, for
+    # "(cache)" rows served from the local response cache, without the cache at all)
+    return round(max(0.0, estimate_cost(label_model(model), pt, ct, 0) - cost), 6)
+
+
+def hit_ratio(pt, cached):
+    return f" ({cached / pt:.0%})" if pt and cached else ""
+
+
+def usage_wide(rows):
+    # room for the latency columns next to the longest model label? Narrower consoles
+    # drop them (and Total) and show the one-line metrics_summary() instead
+    return console.width >= 118 + max((len(str(r[0])) for r in rows), default=5)
+
+
 def usage_table(rows):
+    # rows: (model, pt, ct, cached, total, latency, cost[, metrics record])
+    wide = usage_wide(rows)
+    timed = wide and any(len(r) > 7 and r[7] for r in rows)
     t = Table(title="Session Usage", expand=True)
-    t.add_column("Model")
+    t.add_column("Model", ratio=1, no_wrap=True)  # numbers keep their width, the name gets the rest
     t.add_column("Prompt", justify="right")
     t.add_column("Completion", justify="right")
     t.add_column("Cached", justify="right")
-    t.add_column("Total", justify="right")
-    t.add_column("Latency", justify="right")
+    if wide:
+        t.add_column("Total", justify="right")
+        t.add_column("Latency", justify="right")
+    if timed:
+        t.add_column("Headers", justify="right")
+        t.add_column("TTFT", justify="right")
+        t.add_column("Tok/s", justify="right")
+        t.add_column("Gap p50/95/99", justify="right")
     t.add_column("Est. Cost", justify="right")
-    agg = {"pt": 0, "ct": 0, "cached": 0, "total": 0, "lat": 0.0, "cost": 0.0}
-    for (m, pt, ct, ca, tt, lat, cost) in rows:
-        t.add_row(m, str(pt), str(ct), str(ca), str(tt), f"{lat:.2f}s", f"${cost}")
+    t.add_column("Saved", justify="right")
+    agg = {"pt": 0, "ct": 0, "cached": 0, "total": 0, "lat": 0.0, "cost": 0.0, "saved": 0.0}
+    for row in rows:
+        m, pt, ct, ca, tt, lat, cost = row[:7]
+        saved = cache_savings(m, pt, ct, ca, cost)
+        cells = [m, str(pt), str(ct), f"{ca}{hit_ratio(pt, ca)}"]
+        if wide:
+            cells += [str(tt), f"{lat:.2f}s"]
+        if timed:
+            cells += metric_cells(row[7] if len(row) > 7 else None)
+        t.add_row(*cells, f"${cost}", f"${saved}")
         agg["pt"] += pt
         agg["ct"] += ct
         agg["cached"] += ca
         agg["total"] += tt
         agg["lat"] += lat
         agg["cost"] += cost
+        agg["saved"] += saved
     t.add_row(
         "[b]TOTAL[/b]",
         str(agg["pt"]),
         str(agg["ct"]),
-        str(agg["cached"]),
-        str(agg["total"]),
-        f"{agg['lat']:.2f}s",
+        f"{agg['cached']}{hit_ratio(agg['pt'], agg['cached'])}",
+        *([str(agg["total"]), f"{agg['lat']:.2f}s"] if wide else []),
+        *([""] * 4 if timed else []),
         f"${round(agg['cost'], 6)}",
+        f"${round(agg['saved'], 6)}",
     )
     return t
 
+
+def metric_cells(rec):
+    if not rec:
+        return ["-", "-", "-", "-"]
+    tps = rec.get("tokens_per_s")
+    gaps = "/".join(fmt_ms(rec.get(k)).rstrip("ms") for k in ("gap_p50_s", "gap_p95_s", "gap_p99_s"))
+    return [fmt_ms(rec.get("headers_s")), fmt_ms(rec.get("ttft_s")), "-" if tps is None else f"{tps:g}",
+            "-" if gaps == "-/-/-" else gaps + "ms"]
+
+
+def metrics_summary(sink):
+    # one-line session summary: medians and tails across requests
+    s = sink.summary()
+    if not s["requests"]:
+        return None
+    parts = [f"{s['requests']} request(s)"]
+    for key, label in (("headers_s", "headers"), ("ttft_s", "TTFT"), ("total_s", "total")):
+        if key in s:
+            parts.append(f"{label} p50 {fmt_ms(s[key]['p50'])} / p95 {fmt_ms(s[key]['p95'])}")
+    if "gap_p95_s" in s:
+        parts.append(f"delta gap p95 {fmt_ms(s['gap_p95_s']['p50'])} typical, {fmt_ms(s['gap_p95_s']['p99'])} worst")
+    if "tokens_per_s" in s:
+        parts.append(f"{s['tokens_per_s']['p50']:g} tok/s median")
+    return "[dim]latency: " + " • ".join(parts) + "[/dim]"
+
+
+def profile_table(rows):
+    # rows: (function, calls, self seconds, cumulative seconds), from spans.Profile.top()
+    t = Table(title="Hot Functions (cProfile, main thread)", expand=True)
+    t.add_column("Function", overflow="fold")
+    t.add_column("Calls", justify="right")
+    t.add_column("Self", justify="right")
+    t.add_column("Cumulative", justify="right")
+    for where, calls, tt, ct in rows:
+        t.add_row(where, f"{calls:,}", fmt_ms(tt), fmt_ms(ct))
+    return t
+
 # ---- Provider adapters -------------------------------------------------------
-def send_chat(messages, stream=True, temperature=0.2, max_tokens=512):
-    if PROVIDER == "azure":
-        if not provider_ok():
-            raise RuntimeError("Azure env incomplete.")
-        url = f"{AZURE_ENDPOINT}/openai/deployments/{AZURE_DEPLOY}/chat/completions?api-version={AZURE_VER}"
-        headers = {"api-key": AZURE_KEY, "Content-Type": "application/json"}
-        body = {"messages": messages, "temperature": temperature, "max_tokens": max_tokens, "stream": stream}
-        r = requests.post(url, headers=headers, json=body, stream=stream, timeout=300)
-        r.raise_for_status()
-        return r
+def request_model():
+    # what the request is actually routed to (deployment on Azure), used in cache keys
+    ep = endpoints.primary
+    return ep.ident if ep is not None else f"unsupported:{PROVIDER}"
+
+
+def response_cache(enabled=False):
+    if not (enabled or RESPONSE_CACHE):
+        return None
+    return ResponseCache(
+        RESPONSE_CACHE_DIR,
+        max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+        max_age=RESPONSE_CACHE_MAX_AGE,
+    )
+
+
+def provider_base_url():
+    ep = endpoints.primary
+    return ep.base if ep is not None else None
+
+
+def prewarm():
+    # open the provider connections in the background so the first turn skips the handshake
+    for ep in endpoints.endpoints:
+        if ep.ok:
+            transport.prewarm(ep.base)
+
+
+def send_chat(messages, stream=True, temperature=0.2, max_tokens=512, tools=None):
+    # Fails over across ENDPOINTS (and hedges streams when HEDGE_AFTER_MS is set);
+    # the response carries .endpoint for the HUD and the usage table. Each attempt is
+    # admitted by the rate limiter (prompt estimate + max_tokens) and 429s are retried
+    # with jittered backoff that honours Retry-After.
+    cost = token_counter.messages(messages) + max_tokens if limiter else 0
+    if limiter and tools:
+        cost += token_counter.text(json.dumps(tools))
+
+    def post(url, headers, json, stream):
+        # one budget per Azure deployment (part of the URL) or per OpenAI model: OpenAI
+        # limits are per model, so one model's 429 must not throttle the others
+        key = url.split("?", 1)[0]
+        if json.get("model"):
+            key = f"{key}#{json['model']}"
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if limiter:
+                with span("ratelimit.acquire", "http"):
+                    limiter.acquire(key, cost)
+            # connect (or reuse) + upload + server time until the response headers
+            with span("http.post", "http", url=key, attempt=attempt) as sp:
+                r = transport.post(url, headers=headers, json=json, stream=stream, timeout=300)
+                sp.set(status=r.status_code)
+            if limiter:
+                limiter.update(key, r.headers, r.status_code)
+            if r.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                return r
+            hint = retry_after(r.headers)
+            if hint is not None and hint > RATE_LIMIT_MAX_WAIT:
+                return r  # too long to sit out here: let failover (or the caller) deal with it
+            r.close()
+            time.sleep(backoff(attempt, hint))
+
+    return endpoints.send(post, messages, stream, temperature, max_tokens, tools=tools)
+
+
+async def asend_chat(messages, temperature=0.2, max_tokens=512):
+    # Async streaming counterpart of send_chat(): an async generator of sse events
+    # (Delta / Usage / Finish / StreamError / Done), for overlapping a completion with
+    # MCP tool calls or embedding in async services. The request goes through send_chat()
+    # on a worker thread, so failover, breakers, hedging, admission and 429 retries apply.
+    dec = ChatStreamDecoder()
+    async for chunk in aiter_thread(lambda: send_chat(messages, True, temperature, max_tokens)):
+        for ev in dec.feed(chunk):
+            yield ev
+        if dec.done:
+            return
+    for ev in dec.close():
+        yield ev
+
+
+def live_view(args=None):
+    fps = getattr(args, "fps", None) or RENDER_FPS
+    md = getattr(args, "markdown", False) or RENDER_MARKDOWN
+    return LiveRenderer(console, title="[bold magenta]Assistant[/bold magenta]:", fps=fps, markdown=md)
 
-    if PROVIDER == "openai":
-        if not provider_ok():
-            raise RuntimeError("OpenAI env incomplete.")
-        url = f"{OPENAI_BASE_URL.rstrip('/')}/chat/completions"
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
-        body = {"model": OPENAI_MODEL, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, "stream": stream}
-        r = requests.post(url, headers=headers, json=body, stream=stream, timeout=300)
-        r.raise_for_status()
-        return r
 
-    raise RuntimeError(f"Unsupported PROVIDER={PROVIDER}")
+def stream_reply(r, on_delta, timer=None, tool_calls=None):
+    # Shared by repl() and run_once(): decode the SSE body and hand each text delta to
+    # on_delta (and timestamp it on timer); tool-call fragments go to the tool_calls
+    # assembler. Returns (deltas, usage, decoder stats, complete); complete is False when
+    # the stream ended without [DONE] or a finish_reason (cut off: not worth caching).
+    dec = ChatStreamDecoder()
+    full = []
+    usage = None
+    finished = False
+
+    def traced():
+        # dec.iter_response(r) with the network wait and the decoding as separate spans
+        for chunk in spans.iter_spans(iter_chunks(r), "net.read", "stream"):
+            with span("sse.decode", "stream", bytes=len(chunk)):
+                evs = dec.feed(chunk)
+            yield from evs
+            if dec.done:
+                return
+        yield from dec.close()
+
+    with span("stream_reply", "stream") as sp:
+        try:
+            for ev in traced() if spans.enabled() else dec.iter_response(r):
+                kind = type(ev)
+                if kind is Delta:
+                    if ev.index == 0:
+                        if timer is not None:
+                            timer.delta()
+                        full.append(ev.text)
+                        on_delta(ev.text)
+                elif kind is Usage:
+                    usage = ev.usage
+                elif kind is Finish:
+                    finished = True
+                elif kind is ToolCallDelta:
+                    if timer is not None:
+                        timer.delta()
+                    if tool_calls is not None:
+                        tool_calls.add(ev)
+                elif kind is StreamError:
+                    err = ev.error
+                    raise RuntimeError(err.get("message", err) if isinstance(err, dict) else err)
+        finally:
+            r.close()
+            if timer is not None:
+                timer.finish()
+                ep = getattr(r, "endpoint", None)
+                if ep is not None:
+                    ep.breaker.observe_ttft(timer.ttft)
+            sp.set(deltas=len(full), **dec.stats)
+    if dec.stats["bad"]:
+        console.print(f"[dim]({dec.stats['bad']} malformed stream event(s) skipped)[/dim]")
+    return full, usage, dec.stats, finished or dec.done
 
 # ---- File helpers ------------------------------------------------------------
 def ls(path=None):
@@ -217,25 +646,63 @@ def read_text_file(path):
         return None, f"Decode error: {e}"
 
 # ---- REPL --------------------------------------------------------------------
-def repl():
-    # MCP auto-spawn (stdio)
-    mcp = None
-    mcp_banner_msg = None
-    if MCP_CMD:
+def repl(args=None):
+    prewarm()
+
+    # MCP auto-spawn (stdio) in the background; the banner fills in once it answers
+    mcp = mcp_pool()
+    mcp_state = {"msg": "starting…" if mcp else None, "ready": None, "pool": mcp}
+
+    def start_mcp():
         try:
-            mcp = MCPClient(MCP_CMD)
-            mcp.start()
-            time.sleep(0.4)  # give it a moment to boot
-            try:
-                tools = mcp.list_tools()
-                names = [t.get("name", "?") for t in tools]
-                mcp_banner_msg = "spawned • tools: " + (", ".join(names) or "(none)")
-            except Exception as e:
-                mcp_banner_msg = f"spawned • tools: (error listing: {e})"
+            with span("mcp.start", "mcp"):
+                mcp.start(timeout=MCP_START_TIMEOUT)
+        except Exception as e:
+            mcp_state["msg"] = f"not started: {e}"
+            raise
+        try:
+            tools = mcp.list_tools()
+            names = [t.get("name", "?") for t in tools]
+            mcp_state["msg"] = "spawned • tools: " + (", ".join(names) or "(none)")
         except Exception as e:
-            mcp_banner_msg = f"not started: {e}"
+            mcp_state["msg"] = f"spawned • tools: (error listing: {e})"
+
+    if mcp:
+        mcp_state["ready"] = background(start_mcp)
 
-    banner(mcp_banner_msg)
+    tool_cache = {"src": None, "set": None}
+
+    def offered_tools():
+        # ToolSet for the model, rebuilt when the server's catalog changes; never waits
+        # for an MCP server that is still starting
+        ready = mcp_state["ready"]
+        if not (TOOLS and mcp) or not ready.done() or ready.exception():
+            return None
+        try:
+            tools = mcp.list_tools()
+        except Exception:
+            return None
+        if tools is not tool_cache["src"]:
+            tool_cache["src"], tool_cache["set"] = tools, ToolSet(tools)
+        return tool_cache["set"]
+
+    def call_tool(name, arguments, timeout):
+        with span("tool.call", "mcp", tool=name):
+            return mcp.call_tool(name, arguments, timeout=timeout)
+
+    def get_mcp():
+        # blocks until the spawn finished (only matters for the first MCP command)
+        if not mcp:
+            console.print("[yellow]MCP not running. Set MCP_CMD (or MCP_SERVERS) in .env[/yellow]")
+            return None
+        try:
+            mcp_state["ready"].result(timeout=MCP_START_TIMEOUT + 5)
+        except Exception:
+            console.print(f"[yellow]MCP {mcp_state['msg']}[/yellow]")
+            return None
+        return mcp
+
+    banner(mcp_state)
     console.print()
 
     if not provider_ok():
@@ -247,15 +714,87 @@ def repl():
     attachments = {}
     usage_rows = []
     session_id = uuid.uuid4().hex[:8]
+    sink = MetricsSink(getattr(args, "metrics", None) or METRICS_FILE)
+
+    max_tokens = getattr(args, "max_tokens", None) or 512
+    temperature = getattr(args, "temp", None)
+    temperature = 0.2 if temperature is None else temperature
+    ctx = ContextBuilder(token_counter, window=CONTEXT_WINDOW, reserve=max_tokens, trim_to=CONTEXT_TRIM_TO)
+    indexed = []  # attached roots served through the retrieval index
+    index = None
+
+    # Session log: every turn and state change is appended as it happens
+    store = SessionStore(SESSION_DIR) if SESSIONS else None
+    log = None
+    base = 0  # logged turns before the last /clear
+    resume = getattr(args, "resume", None)
+    if resume and store is None:
+        console.print("[yellow]Session logs are disabled (SESSIONS=0); starting fresh.[/yellow]")
+    elif resume:
+        sid = store.resolve(resume)
+        if sid is None:
+            console.print(f"[red]No single session matches {resume!r} (see --sessions).[/red]")
+        else:
+            t0 = time.time()
+            with span("session.load", "repl"):
+                state, turns = store.load(sid, ctx.budget, token_counter.message)
+            session_id, log = sid, store.open(sid)
+            system_msg = state.get("system")
+            base = state.get("base", 0)
+            for a in state.get("attachments", []):
+                content, err = read_text_file(a["abs"])
+                if err:
+                    console.print(f"[yellow]attachment {a['path']} not restored: {err}[/yellow]")
+                else:
+                    attachments[a["path"]] = content
+            for root in state.get("indexed", []):
+                if os.path.exists(root):
+                    index = index or ChunkIndex(RETRIEVAL_INDEX, include_hidden=RETRIEVAL_INCLUDE_HIDDEN)
+                    index.update(root)
+                    indexed.append(root)
+            for t in turns:
+                history += [{"role": "user", "content": t["user"]}, {"role": "assistant", "content": t["assistant"]}]
+                transcript += [("you", t["user"]), ("assistant", t["assistant"])]
+            console.print(f"✓ resumed session {sid}: last {len(turns)} of {log.turns - base} turn(s) in context, "
+                          f"{len(attachments)} attachment(s), {len(indexed)} indexed root(s) ({time.time() - t0:.2f}s)")
+    if store is not None and log is None:
+        log = store.new(session_id, cwd=os.getcwd(), model=default_model())
+
+    def checkpoint():
+        # logged whenever system prompt, attachments or the /clear mark change
+        if log is not None:
+            log.state(system=system_msg, base=base, indexed=list(indexed),
+                      attachments=[{"path": p, "abs": os.path.abspath(p)} for p in attachments])
+
+    def retrieve(user_text):
+        if not indexed:
+            return []
+        for root in indexed:
+            index.update(root)  # stat-only unless something changed
+        chunks = []
+        for h in index.search(user_text, indexed, k=RETRIEVAL_TOP_K):
+            chunks.append(f"[file:{os.path.relpath(h['path'])}:{h['line']}]\n{h['text']}")
+        return chunks
 
     def build_messages(user_text):
-        msgs = []
-        if system_msg:
-            msgs.append({"role": "system", "content": system_msg})
-        for p, content in attachments.items():
-            msgs.append({"role": "user", "content": f"[file:{p}]\n{content}"})
-        msgs.extend(history[-20:])
-        msgs.append({"role": "user", "content": user_text})
+        with span("retrieve", "repl", roots=len(indexed)):
+            chunks = retrieve(user_text)
+        with span("build_messages", "repl") as sp:
+            msgs, info = ctx.build(system_msg, attachments, history, user_text,
+                                   chunks=chunks, chunk_budget=RETRIEVAL_TOKENS)
+            sp.set(prompt_tokens=info["prompt_tokens"], dropped_turns=info["dropped_turns"])
+        model = default_model()
+        note = f"≈ {info['prompt_tokens']:,} prompt tokens / {info['budget']:,}"
+        cost = estimate_cost(model, info["prompt_tokens"], max_tokens, 0)
+        if cost:
+            note += f" • ≤ ${cost}"
+        if info["chunks"]:
+            note += f" • {info['chunks']} indexed chunk(s), {info['chunk_tokens']:,} tokens"
+        if info["dropped_turns"]:
+            note += f" • {info['dropped_turns']} oldest turn(s) left out"
+        if info["dropped_files"]:
+            note += f" • attachments left out: {', '.join(info['dropped_files'])}"
+        console.print(f"[{'yellow' if info['over'] or info['dropped_files'] else 'dim'}]{note}[/]")
         return msgs
 
     while True:
@@ -274,13 +813,31 @@ def repl():
             break
         if low == "/clear":
             history.clear()
+            ctx.reset()
+            base = log.turns if log is not None else 0
+            checkpoint()
             console.print("✓ history cleared.")
             continue
+        if low == "/save" or user.startswith("/save "):
+            path = user[len("/save"):].strip()
+            if log is not None:
+                log.sync()
+            if path:
+                with open(path, "w", encoding="utf-8") as f:
+                    for who, text in transcript:
+                        f.write(f"## {'You' if who == 'you' else 'Assistant'}\n\n{text}\n\n")
+                console.print(f"✓ transcript written to {path} ({len(transcript) // 2} turn(s))")
+            if log is not None:
+                console.print(f"✓ session {session_id} saved; resume with --resume {session_id}")
+            elif not path:
+                console.print("Session logs are disabled (SESSIONS=0); use /save <file> to write the transcript.")
+            continue
         if low == "/status":
-            banner(mcp_banner_msg)
+            banner(mcp_state)
             continue
         if user.startswith("/system "):
             system_msg = user[len("/system "):].strip()
+            checkpoint()
             console.print("✓ system prompt set.")
             continue
         if low == "/pwd":
@@ -297,32 +854,57 @@ def repl():
             continue
         if user.startswith("/attach "):
             path = user.split(" ", 1)[1].strip()
+            if os.path.isdir(path) or (os.path.isfile(path) and os.path.getsize(path) > MAX_ATTACH_BYTES):
+                if index is None:
+                    index = ChunkIndex(RETRIEVAL_INDEX, include_hidden=RETRIEVAL_INCLUDE_HIDDEN)
+                t0 = time.time()
+                st = index.update(path)
+                root = os.path.abspath(path)
+                if root not in indexed:
+                    indexed.append(root)
+                    checkpoint()
+                console.print(f"✓ indexed {path} ({st['files']} files, {st['indexed']} re-indexed, "
+                              f"{st['chunks']} new chunks, {time.time() - t0:.2f}s); top matches are sent per turn")
+                continue
             content, err = read_text_file(path)
             if err:
                 console.print(f"[red]{err}[/red]")
             else:
                 attachments[path] = content
+                checkpoint()
                 console.print(f"✓ attached {path} ({len(content)} bytes)")
             continue
         if low == "/attachments":
-            if not attachments:
+            if not attachments and not indexed:
                 console.print("(no attachments)")
             else:
                 for p, c in attachments.items():
                     console.print(f"- {p} [{len(c)} bytes]")
+                for root in indexed:
+                    info = index.summary(root)
+                    console.print(f"- {os.path.relpath(root)} (indexed: {info['files']} files, {info['bytes']} bytes, {info['chunks']} chunks)")
             continue
         if user.startswith("/detach "):
             path = user.split(" ", 1)[1].strip()
-            console.print(f"{'✓ detached' if attachments.pop(path, None) is not None else '(not attached)'} {path}")
+            root = os.path.abspath(path)
+            if root in indexed:
+                indexed.remove(root)
+                checkpoint()
+                console.print(f"✓ detached {path}")
+                continue
+            if attachments.pop(path, None) is not None:
+                checkpoint()
+                console.print(f"✓ detached {path}")
+            else:
+                console.print(f"(not attached) {path}")
             continue
 
         # -------- MCP commands
-        if low == "/mcp.tools":
-            if not mcp:
-                console.print("[yellow]MCP not running. Set MCP_CMD in .env[/yellow]")
-            else:
+        if low in ("/mcp.tools", "/mcp.tools refresh"):
+            client = get_mcp()
+            if client:
                 try:
-                    tools = mcp.list_tools()
+                    tools = client.list_tools(refresh=low.endswith("refresh"))
                     if not tools:
                         console.print("(no tools)")
                     else:
@@ -333,9 +915,8 @@ def repl():
             continue
 
         if user.startswith("/mcp.call "):
-            if not mcp:
-                console.print("[yellow]MCP not running. Set MCP_CMD in .env[/yellow]")
-            else:
+            client = get_mcp()
+            if client:
                 try:
                     # /mcp.call <toolName> {jsonArgs}
                     parts = user.split(" ", 2)
@@ -346,7 +927,7 @@ def repl():
                         args = {}
                         if len(parts) == 3 and parts[2].strip():
                             args = json.loads(parts[2])
-                        res = mcp.call_tool(name, args)
+                        res = client.call_tool(name, args)
                         console.print(res)
                 except Exception as e:
                     console.print(f"[red]tools/call failed: {e}[/red]")
@@ -358,43 +939,68 @@ def repl():
             continue
 
         messages = build_messages(user)
+        toolset = offered_tools()
+        spec_tokens = token_counter.text(json.dumps(toolset.specs)) if toolset else 0
         try:
-            start = time.time()
-            r = send_chat(messages, stream=True)
-            console.print("[bold magenta]Assistant[/bold magenta]: ", end="")
-            full = []
-            usage_final = None
-            for line in r.iter_lines():
-                if not line:
-                    continue
-                if line.startswith(b"data: "):
-                    chunk = line[6:].decode("utf-8").strip()
-                    if chunk == "[DONE]":
-                        break
-                    try:
-                        ob = json.loads(chunk)
-                        delta = ob["choices"][0]["delta"].get("content", "")
-                        if delta:
-                            full.append(delta)
-                            console.print(delta, end="")
-                        if "usage" in ob:
-                            usage_final = ob["usage"]
-                    except Exception:
-                        pass
-            console.print()
-            assistant_text = "".join(full)
+            # the model may answer with tool calls: run them, append the results and ask
+            # again, up to TOOL_MAX_ROUNDS times; the last round offers no tools, so it
+            # has to answer. Only the final answer enters history.
+            turn_rows = []
+            for round_no in range(TOOL_MAX_ROUNDS + 1):
+                calls = ToolCallAssembler()
+                timer = RequestTimer()
+                last_round = round_no == TOOL_MAX_ROUNDS
+                if last_round and toolset:
+                    console.print(f"[yellow]{TOOL_MAX_ROUNDS} tool round(s) used (TOOL_MAX_ROUNDS): asking for an answer without tools.[/yellow]")
+                with span("send_chat", "http", round=round_no):
+                    r = send_chat(messages, stream=True, temperature=temperature, max_tokens=max_tokens,
+                                  tools=toolset.specs if toolset and not last_round else None)
+                timer.got_headers()
+                with live_view(args) as view:
+                    full, usage_final, _, _ = stream_reply(r, view.push, timer, calls)
+                assistant_text = "".join(full)
+
+                model, pt, ct, cached, total = summarize_usage(
+                    usage_final,
+                    fallback_model=default_model(),
+                )
+                rec = timer.record(model, ct, session=session_id, endpoint=getattr(getattr(r, "endpoint", None), "name", None))
+                sink.add(rec)
+                cost = estimate_cost(model, pt, ct, cached)
+                usage_rows.append((served_by(model, r), pt, ct, cached, total, timer.total, cost, rec))
+                turn_rows.append(usage_rows[-1])
+                if pt:
+                    console.print(f"[dim]prompt cache: {cached:,}/{pt:,} tokens ({cached / pt:.0%})[/dim]")
+                if not calls:
+                    break
+                if last_round:
+                    console.print("[yellow]Tool calls in the final round were not run.[/yellow]")
+                    break
+                calls = calls.calls()
+                messages.append({"role": "assistant", "content": assistant_text or None, "tool_calls": [
+                    {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                    for c in calls]})
+                t0 = time.perf_counter()
+                results = run_calls(call_tool, toolset, calls, timeout=TOOL_TIMEOUT,
+                                    limit=TOOL_RESULT_MAX_CHARS, workers=TOOL_CONCURRENCY)
+                # the results must still fit the prompt budget (with the reply reserved)
+                fitted = ctx.fit(messages, [res["content"] for res in results], extra=spec_tokens)
+                for res, content in zip(results, fitted):
+                    messages.append({"role": "tool", "tool_call_id": res["id"], "content": content})
+                    usage_rows.append((f"tool: {res['name']}" + ("" if res["ok"] else " (error)"), 0, 0, 0, 0, res["latency"], 0.0))
+                    cut = " (cut to fit the context)" if content is not res["content"] else ""
+                    console.print(f"[{'dim' if res['ok'] else 'yellow'}]{'✓' if res['ok'] else '✗'} {res['name']} "
+                                  f"{fmt_ms(res['latency'])} • {len(content):,} chars{cut}[/]")
+                if len(results) > 1:
+                    console.print(f"[dim]{len(results)} tools in {fmt_ms(time.perf_counter() - t0)} (parallel)[/dim]")
+
             history.append({"role": "user", "content": user})
             history.append({"role": "assistant", "content": assistant_text})
             transcript.append(("you", user))
             transcript.append(("assistant", assistant_text))
-
-            model, pt, ct, cached, total = summarize_usage(
-                usage_final,
-                fallback_model=("gpt-5-chat-latest" if PROVIDER == "azure" else OPENAI_MODEL),
-            )
-            latency = time.time() - start
-            cost = estimate_cost(model, pt, ct, cached)
-            usage_rows.append((model, pt, ct, cached, total, latency, cost))
+            if log is not None:
+                with span("session.log", "repl"):
+                    log.turn(user, assistant_text, (turn_rows[-1][0], *(sum(r[i] for r in turn_rows) for i in range(1, 7))))
 
         except requests.HTTPError as e:
             status = e.response.status_code if e.response is not None else "?"
@@ -410,11 +1016,24 @@ def repl():
     # On exit: show usage and stop MCP
     if usage_rows:
         console.print(usage_table(usage_rows))
+        summary = metrics_summary(sink)
+        if summary:
+            console.print(summary)
+    sink.close()
+    if log is not None and log.turns:
+        log.close()
+        console.print(f"[dim]session {session_id} • resume with --resume {session_id}[/dim]")
+    if store is not None:
+        store.close()
     if mcp:
         mcp.close()
+    if index is not None:
+        index.close()
+    transport.close()
 
 # ---- One-shot ---------------------------------------------------------------
 def run_once(args):
+    prewarm()  # handshake overlaps with reading the messages file
     messages = []
     if args.system:
         messages.append({"role": "system", "content": args.system})
@@ -424,39 +1043,280 @@ def run_once(args):
             messages.extend(data["messages"] if isinstance(data, dict) and "messages" in data else data)
     else:
         messages.append({"role": "user", "content": args.prompt})
-    r = send_chat(messages, stream=args.stream, temperature=args.temp, max_tokens=args.max_tokens)
+    cache = response_cache(args.cache)
+    key = cache_key(messages, request_model(), args.temp, args.max_tokens) if cache else None
+    entry = cache.get(key) if cache else None
+    sink = MetricsSink(args.metrics or METRICS_FILE)
+    timer = RequestTimer()
+    if entry is not None:
+        r = CachedResponse(entry)  # replayed through the same rendering path as a live response
+    else:
+        with span("send_chat", "http"):
+            r = send_chat(messages, stream=args.stream, temperature=args.temp, max_tokens=args.max_tokens)
+    timer.got_headers()
     if args.stream:
-        console.print("[bold magenta]Assistant[/bold magenta]: ", end="")
-        usage_final = None
-        for line in r.iter_lines():
-            if not line:
-                continue
-            if line.startswith(b"data: "):
-                chunk = line[6:].decode("utf-8").strip()
-                if chunk == "[DONE]":
-                    break
-                try:
-                    ob = json.loads(chunk)
-                    delta = ob["choices"][0]["delta"].get("content", "")
-                    if delta:
-                        console.print(delta, end="")
-                    if "usage" in ob:
-                        usage_final = ob["usage"]
-                except Exception:
-                    pass
-        console.print()
+        with live_view(args) as view:
+            full, usage_final, _, complete = stream_reply(r, view.push, timer)
+        if cache and entry is None and complete:
+            cache.put(key, "".join(full), usage=usage_final, deltas=full, model=default_model())
         if usage_final:
             model, pt, ct, cached, total = summarize_usage(
                 usage_final,
-                fallback_model=("gpt-5-chat-latest" if PROVIDER == "azure" else OPENAI_MODEL),
+                fallback_model=default_model(),
             )
             cost = estimate_cost(model, pt, ct, cached)
-            t = usage_table([(model, pt, ct, cached, total, 0.0, cost)])
-            console.print(t)
+            rec = timer.record(model, ct, cached=entry is not None)
+            sink.add(rec)
+            if entry is not None:
+                model, cost = f"{model} (cache)", 0.0
+            else:
+                model = served_by(model, r)
+            rows = [(model, pt, ct, cached, total, timer.total, cost, rec)]
+            console.print(usage_table(rows))
+            if not usage_wide(rows):
+                console.print(metrics_summary(sink))
     else:
-        data = r.json()
+        with span("json.decode", "http"):
+            data = r.json()
+        timer.finish()
         content = data["choices"][0]["message"]["content"]
+        if cache and entry is None:
+            cache.put(key, content, usage=data.get("usage"), model=default_model())
+        model, _, ct, _, _ = summarize_usage(data.get("usage"), fallback_model=default_model())
+        sink.add(timer.record(model, ct, cached=entry is not None))
         console.print(Panel.fit(content, title="Assistant", border_style="magenta"))
+    sink.close()
+
+# ---- Batch -----------------------------------------------------------------
+def _batch_items(path, system=None):
+    # stream the input: one JSON list of messages (or {"id", "messages"}) per line
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except Exception as e:
+                yield str(n), None, f"bad JSON on line {n}: {e}"
+                continue
+            rid = str(data.get("id", n)) if isinstance(data, dict) else str(n)
+            msgs = data.get("messages") if isinstance(data, dict) else data
+            if not isinstance(msgs, list):
+                yield rid, None, f"line {n}: expected a list of messages"
+                continue
+            if system and not any(m.get("role") == "system" for m in msgs):
+                msgs = [{"role": "system", "content": system}] + msgs
+            yield rid, msgs, None
+
+
+def _batch_done_ids(path):
+    # ids that already have a successful row -> skipped on resume (errors are retried)
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except Exception:
+                continue  # torn last line from a killed run
+            if isinstance(row, dict) and "error" not in row and "id" in row:
+                done.add(str(row["id"]))
+    return done
+
+
+def _batch_one(rid, messages, args, cache=None):
+    timer = RequestTimer()
+    key = cache_key(messages, request_model(), args.temp, args.max_tokens) if cache else None
+    entry = cache.get(key) if cache else None
+    try:
+        if entry is not None:
+            data = CachedResponse(entry).json()
+        else:
+            r = send_chat(messages, stream=False, temperature=args.temp, max_tokens=args.max_tokens)
+            timer.got_headers()
+            data = r.json()
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else "?"
+        return {"id": rid, "error": f"HTTP {status}", "latency": round(timer.finish().total, 3)}
+    except Exception as e:
+        return {"id": rid, "error": f"{type(e).__name__}: {e}", "latency": round(timer.finish().total, 3)}
+    latency = timer.finish().total
+    usage = summarize_usage(data.get("usage"), fallback_model=default_model())
+    model, pt, ct, cached, total = usage
+    try:
+        content = data["choices"][0]["message"]["content"]
+    except Exception:
+        content = None
+    if cache and entry is None and content is not None:
+        cache.put(key, content, usage=data.get("usage"), model=default_model())
+    row = {
+        "id": rid,
+        "usage": list(usage),
+        "latency": round(latency, 3),
+        "cost": 0.0 if entry is not None else estimate_cost(model, pt, ct, cached),
+        "content": content,
+    }
+    if entry is not None:
+        row["cached"] = True
+    elif getattr(r, "endpoint", None) is not None and len(endpoints.endpoints) > 1:
+        row["endpoint"] = r.endpoint.name
+    row["metrics"] = timer.record(model, ct, id=rid, cached=entry is not None)
+    return row
+
+
+def run_batch(args):
+    out_path = args.out or (os.path.splitext(args.batch)[0] + ".out.jsonl")
+    done = _batch_done_ids(out_path)
+    cache = response_cache(args.cache)
+    workers = max(1, args.concurrency)
+    transport.pool_size = max(transport.pool_size, workers)  # one keep-alive socket per worker
+    # per-model aggregates instead of a row per prompt keeps memory flat on huge inputs
+    agg = {}
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    lock = threading.Lock()
+    sink = MetricsSink(args.metrics or METRICS_FILE)
+
+    def record(row, out):
+        with lock:
+            rec = row.pop("metrics", None)
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            if rec is not None:
+                sink.add(rec)
+            if "error" in row:
+                counts["failed"] += 1
+                return
+            counts["ok"] += 1
+            model, pt, ct, cached, total = row["usage"]
+            if row.get("cached"):
+                model = f"{model} (cache)"
+            elif row.get("endpoint"):
+                model = f"{model} @ {row['endpoint']}"
+            a = agg.setdefault(model, [model, 0, 0, 0, 0, 0.0, 0.0])
+            a[1] += pt; a[2] += ct; a[3] += cached; a[4] += total
+            a[5] += row["latency"]; a[6] = round(a[6] + row["cost"], 6)
+
+    prewarm()
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for rid, msgs, err in _batch_items(args.batch, system=args.system):
+            if rid in done:
+                counts["skipped"] += 1
+                continue
+            if err:
+                record({"id": rid, "error": err}, out)
+                continue
+            # bounded in-flight window: never read far ahead of the workers
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    record(fut.result(), out)
+            pending.add(pool.submit(_batch_one, rid, msgs, args, cache))
+        for fut in pending:
+            record(fut.result(), out)
+
+    console.print(
+        f"batch: {counts['ok']} ok, {counts['failed']} failed, {counts['skipped']} skipped (resume) → {out_path}"
+    )
+    if agg:
+        console.print(usage_table([tuple(a) for a in agg.values()]))
+        summary = metrics_summary(sink)
+        if summary:
+            console.print(summary)
+    sink.close()
+    transport.close()
+    return 0 if not counts["failed"] else 1
+
+# ---- Sessions ---------------------------------------------------------------
+def list_sessions(query=None):
+    store = SessionStore(SESSION_DIR)
+    rows = store.list(query)
+    store.close()
+    if not rows:
+        console.print("(no sessions)" if not query else f"(no sessions matching {query!r})")
+        return
+    t = Table(title="Sessions" if not query else f"Sessions matching {query!r}")
+    for col in ("ID", "Updated", "Turns", "Tokens", "Cost", "Directory", "First prompt"):
+        t.add_column(col, justify="right" if col in ("Turns", "Tokens", "Cost") else "left")
+    for r in rows:
+        t.add_row(r["id"], time.strftime("%Y-%m-%d %H:%M", time.localtime(r["updated"])), str(r["turns"]),
+                  f"{r['tokens']:,}", f"${r['cost']:.4f}", r["cwd"] or "", r["title"])
+    console.print(t)
+
+# ---- Daemon ----------------------------------------------------------------
+def run_daemon(args):
+    # Serves one-shot requests from cli/hud.py over a Unix socket, reusing this
+    # process's pooled connections, breaker/limiter state, response cache and MCP child.
+    prewarm()
+    mcp = mcp_pool()
+    mcp_ready = background(mcp.start, MCP_START_TIMEOUT) if mcp else None
+    cache = response_cache(True)  # used only by requests that ask for it
+    sink = MetricsSink(args.metrics or METRICS_FILE)
+    sink_lock = threading.Lock()
+
+    def get_mcp():
+        if not mcp:
+            raise RuntimeError("MCP not configured. Set MCP_CMD (or MCP_SERVERS) in .env")
+        mcp_ready.result(timeout=MCP_START_TIMEOUT + 5)
+        return mcp
+
+    def chat(req, emit):
+        if not provider_ok():
+            raise RuntimeError("Provider not configured. Set .env first.")
+        messages = []
+        if req.get("system"):
+            messages.append({"role": "system", "content": req["system"]})
+        messages.extend(req.get("messages") or [])
+        if req.get("prompt"):
+            messages.append({"role": "user", "content": req["prompt"]})
+        temp = req.get("temperature", 0.2)
+        max_tokens = req.get("max_tokens") or 512
+        use_cache = req.get("cache") or RESPONSE_CACHE
+        key = cache_key(messages, request_model(), temp, max_tokens) if use_cache else None
+        entry = cache.get(key) if use_cache else None
+        timer = RequestTimer()
+        r = CachedResponse(entry) if entry is not None else send_chat(messages, True, temp, max_tokens)
+        timer.got_headers()
+        full, usage, _, complete = stream_reply(r, lambda d: emit({"delta": d}), timer)
+        if use_cache and entry is None and complete:
+            cache.put(key, "".join(full), usage=usage, deltas=full, model=default_model())
+        model, pt, ct, cached, total = summarize_usage(usage, fallback_model=default_model())
+        cost = 0.0 if entry is not None else estimate_cost(model, pt, ct, cached)
+        rec = timer.record(model, ct, cached=entry is not None)
+        with sink_lock:
+            sink.add(rec)
+        return {"model": f"{model} (cache)" if entry is not None else served_by(model, r),
+                "usage": {"prompt_tokens": pt, "completion_tokens": ct, "cached_tokens": cached, "total_tokens": total},
+                "cost": round(cost, 6), "metrics": rec}
+
+    def mcp_tools(req, emit):
+        return {"result": get_mcp().list_tools(refresh=bool(req.get("refresh")))}
+
+    def mcp_call(req, emit):
+        return {"result": get_mcp().call_tool(req["name"], req.get("arguments") or {})}
+
+    daemon = Daemon(DAEMON_SOCKET, idle=DAEMON_IDLE)
+    base_status = daemon.handlers["status"]
+
+    def status(req, emit):
+        out = base_status(req, emit)
+        out["endpoints"] = [{"name": n, "state": st, "latency_s": lat, "ttft_s": ttft, "ok": ok, "failed": bad}
+                            for n, st, lat, ttft, ok, bad in endpoints.status()]
+        if mcp:
+            out["mcp"] = "starting" if not mcp_ready.done() else ("failed" if mcp_ready.exception() else "running")
+            out["mcp_servers"] = mcp.stats()
+        return out
+
+    daemon.handlers.update({"chat": chat, "mcp.tools": mcp_tools, "mcp.call": mcp_call, "status": status})
+    try:
+        daemon.serve(on_ready=lambda path: console.print(f"[dim]gpt-hud daemon on {path} (pid {os.getpid()})[/dim]"))
+    finally:
+        sink.close()
+        if mcp:
+            mcp.close()
+        transport.close()
 
 # ---- Main -------------------------------------------------------------------
 def main():
@@ -467,10 +1327,56 @@ def main():
     ap.add_argument("--stream", action="store_true")
     ap.add_argument("--temp", type=float, default=0.2)
     ap.add_argument("--max-tokens", type=int, default=512)
+    ap.add_argument("--batch", help="JSONL file, one message list per line")
+    ap.add_argument("--out", help="batch output JSONL (default: <batch>.out.jsonl); resumed if it exists")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--cache", action="store_true", help="reuse identical responses from the on-disk cache")
+    ap.add_argument("--markdown", action="store_true", help="render streamed replies as Markdown")
+    ap.add_argument("--hedge", type=float, metavar="MS", help="hedge streamed requests after MS without a token (needs ENDPOINTS)")
+    ap.add_argument("--metrics", help="latency metrics export: *.prom = Prometheus textfile, otherwise JSONL")
+    ap.add_argument("--fps", type=float, help=f"max redraws per second while streaming (default {RENDER_FPS:g})")
+    ap.add_argument("--resume", metavar="ID", help="continue a logged REPL session (id, id prefix or 'last')")
+    ap.add_argument("--sessions", nargs="?", const="", metavar="QUERY", help="list logged sessions, optionally matching QUERY")
+    ap.add_argument("--daemon", action="store_true", help="serve requests from cli/hud.py on a Unix socket (DAEMON_SOCKET)")
+    ap.add_argument("--trace", metavar="PATH", help="write a Chrome trace-event JSON of where the time went (chrome://tracing, ui.perfetto.dev)")
+    ap.add_argument("--profile", nargs="?", type=int, const=PROFILE_TOP, metavar="N",
+                    help=f"run under cProfile and print the N hottest functions at exit (default {PROFILE_TOP})")
     args = ap.parse_args()
+    if args.hedge is not None:
+        endpoints.hedge_after = args.hedge / 1000.0
 
+    trace = args.trace or TRACE_FILE
+    if trace:
+        spans.start()
+        for name, t0, t1 in zip(("import deps", "load .env", "import cli modules", "config"), _boot, _boot[1:]):
+            spans.record(name, t0, t1, cat="startup")
+    prof = spans.Profile() if args.profile else None
+    try:
+        if prof is not None:
+            with prof:
+                return run(args)
+        return run(args)
+    finally:
+        if prof is not None:
+            console.print(profile_table(prof.top(args.profile, root=os.path.dirname(os.path.abspath(__file__)))))
+        if trace:
+            n = spans.write(trace)
+            console.print(f"[dim]trace: {n} events → {trace}[/dim]")
+
+
+def run(args):
+    if args.daemon:
+        return run_daemon(args)
+    if args.sessions is not None:
+        return list_sessions(args.sessions or None)
+
+    if args.batch:
+        if not provider_ok():
+            console.print("[red]Provider not configured for batch. Set .env first.[/red]")
+            sys.exit(2)
+        sys.exit(run_batch(args))
     if not args.prompt and not args.messages_file:
-        return repl()
+        return repl(args)
     if not provider_ok():
         console.print("[red]Provider not configured for one-shot. Set .env or use REPL for MCP-only.[/red]")
         sys.exit(2)
@@ -0,0 +1,138 @@
+# hud.py — thin client for the gpt-hud daemon (stdlib only, so it starts in milliseconds)
+# Forwards a one-shot request over the daemon's Unix socket and streams the reply to
+# stdout. Starts the daemon (`gpt_cli.py --daemon`) on first use unless --no-spawn.
+#
+#   python cli/hud.py "explain this error"            # or: --prompt, or text on stdin
+#   python cli/hud.py --messages-file chat.json --usage
+#   python cli/hud.py --tools | --call NAME '{"json": "args"}'
+#   python cli/hud.py --status | --stop
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from daemon import is_running, socket_path
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPAWN_TIMEOUT = float(os.getenv("DAEMON_SPAWN_TIMEOUT", "20"))
+
+
+def spawn(path):
+    # detached daemon; it inherits this environment (and reads .env like the CLI does)
+    subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "gpt_cli.py"), "--daemon"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True, env={**os.environ, "DAEMON_SOCKET": path},
+    )
+    deadline = time.monotonic() + SPAWN_TIMEOUT
+    while time.monotonic() < deadline:
+        if is_running(path):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def call(path, req):
+    # -> iterator of reply objects
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect(path)
+    try:
+        s.sendall((json.dumps(req) + "\n").encode("utf-8"))
+        with s.makefile("rb") as f:
+            for line in f:
+                yield json.loads(line)
+    finally:
+        s.close()
+
+
+def main():
+    ap = argparse.ArgumentParser("hud", description="Thin client for the gpt-hud daemon")
+    ap.add_argument("text", nargs="?", help="prompt (same as --prompt)")
+    ap.add_argument("--prompt")
+    ap.add_argument("--messages-file")
+    ap.add_argument("--system")
+    ap.add_argument("--temp", type=float, default=0.2)
+    ap.add_argument("--max-tokens", type=int, default=512)
+    ap.add_argument("--cache", action="store_true", help="reuse identical responses from the on-disk cache")
+    ap.add_argument("--usage", action="store_true", help="print model, tokens and latency to stderr")
+    ap.add_argument("--tools", action="store_true", help="list MCP tools of the daemon's MCP server")
+    ap.add_argument("--call", nargs=2, metavar=("TOOL", "JSON"), help="call an MCP tool")
+    ap.add_argument("--status", action="store_true")
+    ap.add_argument("--stop", action="store_true")
+    ap.add_argument("--no-spawn", action="store_true", help="fail instead of starting the daemon")
+    ap.add_argument("--socket", help="socket path (default $DAEMON_SOCKET or $XDG_RUNTIME_DIR/gpt-hud.sock)")
+    args = ap.parse_args()
+
+    path = socket_path(args.socket)
+    if args.stop or args.status:
+        if not is_running(path):
+            print("daemon not running", file=sys.stderr)
+            return 0 if args.stop else 3
+        try:
+            for msg in call(path, {"op": "stop" if args.stop else "status"}):
+                if "done" in msg:
+                    msg.pop("done")
+                    print(json.dumps(msg))
+        except OSError:  # it was just shutting down
+            print("daemon not running", file=sys.stderr)
+            return 0 if args.stop else 3
+        return 0
+
+    if args.tools:
+        req = {"op": "mcp.tools"}
+    elif args.call:
+        try:
+            req = {"op": "mcp.call", "name": args.call[0], "arguments": json.loads(args.call[1])}
+        except ValueError as e:
+            print(f"bad JSON arguments: {e}", file=sys.stderr)
+            return 2
+    else:
+        req = {"op": "chat", "system": args.system, "temperature": args.temp,
+               "max_tokens": args.max_tokens, "cache": args.cache}
+        if args.messages_file:
+            with open(args.messages_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            req["messages"] = data["messages"] if isinstance(data, dict) and "messages" in data else data
+        else:
+            prompt = args.prompt or args.text
+            if not prompt and not sys.stdin.isatty():
+                prompt = sys.stdin.read()
+            if not prompt:
+                ap.error("nothing to send: give a prompt, --messages-file, or pipe text in")
+            req["prompt"] = prompt
+
+    if not is_running(path) and (args.no_spawn or not spawn(path)):
+        print(f"gpt-hud daemon not reachable on {path}", file=sys.stderr)
+        return 2
+
+    status = 1
+    out = sys.stdout
+    streamed = False
+    for msg in call(path, req):
+        if "delta" in msg:
+            out.write(msg["delta"])
+            out.flush()
+            streamed = True
+        elif "error" in msg:
+            print(("\n" if streamed else "") + f"error: {msg['error']}", file=sys.stderr)
+            return 1
+        elif msg.get("done"):
+            status = 0
+            if req["op"] == "chat":
+                out.write("\n")
+                if args.usage:
+                    m = msg.get("metrics") or {}
+                    u = msg.get("usage") or {}
+                    print(f"{msg.get('model')} • {u.get('prompt_tokens', 0)}+{u.get('completion_tokens', 0)} tokens"
+                          f" • ttft {m.get('ttft_s')}s • total {m.get('total_s')}s • ${msg.get('cost', 0)}", file=sys.stderr)
+            else:
+                print(json.dumps(msg.get("result"), indent=2, ensure_ascii=False))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,97 +1,329 @@
 # minimal stdio JSON-RPC client with stderr capture (spaces only)
-import json, os, subprocess, threading, queue, re, time
-CONTENT_LEN_RE = re.compile(rb"Content-Length:\s*(\d+)\r\n\r\n", re.I)
+import asyncio, json, os, threading, time
+from concurrent.futures import CancelledError
+from spans import span, record
 
-class MCPClient:
-    def __init__(self, cmd, cwd=None, env=None):
+PROTOCOL_VERSION = "2024-11-05"
+CLIENT_INFO = {"name": "gpt-hud", "version": "0.1.0"}
+METHOD_NOT_FOUND = -32601
+# tool method names per server dialect; picked once at initialize, then remembered
+DIALECTS = {
+    "mcp": {"list": "tools/list", "call": "tools/call"},
+    "legacy": {"list": "tools.list", "call": "tools/execute"},
+}
+READ_SIZE = 1 << 16
+COMPACT_AT = 1 << 20  # drop consumed bytes once this much has piled up at the front
+
+
+class FrameParser:
+    # Incremental stdio framing: LSP-style headers (Content-Length + any other headers)
+    # or newline-delimited JSON, auto-detected per message. Bytes live in one bytearray;
+    # `pos` tracks what is consumed and `scan` where the next delimiter search resumes,
+    # so every byte is scanned and copied a constant number of times.
+    def __init__(self):
+        self.buf = bytearray(); self.pos = 0; self.scan = 0
+        self.need = None  # body length once a header block is parsed
+        self.bad = 0  # header blocks without a usable Content-Length
+
+    def feed(self, chunk):
+        self.buf += chunk
+        out = []
+        buf = self.buf
+        while True:
+            if self.need is not None:
+                if len(buf) - self.pos < self.need: break
+                end = self.pos + self.need
+                out.append(bytes(buf[self.pos:end]))
+                self.pos = self.scan = end; self.need = None
+                continue
+            while self.pos < len(buf) and buf[self.pos] in b"\r\n \t": self.pos += 1
+            if self.pos >= len(buf): break
+            self.scan = max(self.scan, self.pos)
+            if buf[self.pos] in b"{[":  # newline-delimited JSON
+                nl = buf.find(b"\n", self.scan)
+                if nl < 0: self.scan = len(buf); break
+                out.append(bytes(buf[self.pos:nl]))
+                self.pos = self.scan = nl + 1
+                continue
+            end = buf.find(b"\r\n\r\n", self.scan)
+            if end < 0: self.scan = max(self.pos, len(buf) - 3); break
+            self.need = None
+            for line in bytes(buf[self.pos:end]).split(b"\r\n"):
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length" and value.strip().isdigit():
+                    self.need = int(value)
+            self.pos = self.scan = end + 4
+            if self.need is None: self.bad += 1
+        if self.pos >= COMPACT_AT or (self.pos and self.pos == len(buf)):
+            del buf[:self.pos]; self.scan -= self.pos; self.pos = 0
+        return out
+
+
+class MCPError(RuntimeError):
+    # JSON-RPC error response; `code` is the JSON-RPC error code (-32601 = method not found)
+    def __init__(self, message, code=None, data=None):
+        super().__init__(message); self.code = code; self.data = data
+
+
+def encode_frame(payload, framing="content-length"):
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    if framing == "ndjson": return data + b"\n"
+    return f"Content-Length: {len(data)}\r\n\r\n".encode("utf-8") + data
+
+class AsyncMCPClient:
+    # asyncio-native client: one reader task resolves per-id futures, so any number of
+    # coroutines can have requests in flight on one stdio connection
+    def __init__(self, cmd, cwd=None, env=None, framing="content-length"):
         self.cmd = cmd if isinstance(cmd, list) else cmd.split()
+        self.framing = framing  # how we write; reading auto-detects either framing
         self.cwd = cwd or os.getcwd()
         self.env = {**os.environ, **(env or {})}
         self.proc = None
-        self.reader = None
-        self.err_reader = None
-        self.q = queue.Queue()
         self.stderr_buf = []
         self._id = 0
-        self._lock = threading.Lock()
+        self._tasks = []
+        self._wlock = None
+        self._pending = {}  # request id -> asyncio.Future, resolved by the reader task
+        self._progress = {}  # progress token -> callback(params)
+        self.on_notification = None  # callback(method, params) for server notifications
+        self.server_info = None  # initialize result: protocolVersion, capabilities, serverInfo
+        self.dialect = None  # key of DIALECTS once negotiated
+        self._tools = None  # cached tools/list result (with schemas); reset on list_changed
 
-    def start(self):
-        self.proc = subprocess.Popen(
-            self.cmd, cwd=self.cwd, env=self.env,
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
-        )
-        self.reader = threading.Thread(target=self._read_loop, daemon=True); self.reader.start()
-        self.err_reader = threading.Thread(target=self._err_loop, daemon=True); self.err_reader.start()
-        time.sleep(0.2)
+    async def start(self, timeout=15.0):
+        # Spawn and wait for the `initialize` handshake instead of sleeping: returns as
+        # soon as the server answers, fails fast if it dies or stays silent.
+        self._wlock = asyncio.Lock()
+        with span("mcp.spawn", "mcp", cmd=" ".join(self.cmd)):
+            self.proc = await asyncio.create_subprocess_exec(
+                *self.cmd, cwd=self.cwd, env=self.env,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            )
+        self._tasks = [asyncio.ensure_future(self._read_loop()), asyncio.ensure_future(self._err_loop())]
+        await self.initialize(timeout)
 
-    def close(self):
+    async def initialize(self, timeout=15.0):
+        params = {"protocolVersion": PROTOCOL_VERSION, "capabilities": {}, "clientInfo": CLIENT_INFO}
+        try:
+            self.server_info = await self.request("initialize", params, timeout=timeout) or {}
+        except MCPError as e:
+            if e.code != METHOD_NOT_FOUND: raise
+            self.server_info = {}  # pre-handshake server: usable as-is
+        except TimeoutError:
+            raise TimeoutError(f"MCP initialize timed out after {timeout:g}s (stderr: {self._stderr_tail()})")
+        else:
+            self._write({"jsonrpc":"2.0","method":"notifications/initialized"})
+        caps = self.server_info.get("capabilities")
+        if caps is None or "tools" in caps:
+            try: await self.list_tools()  # negotiates the dialect and warms the catalog
+            except Exception: pass
+        return self.server_info
+
+    async def close(self):
         try:
-            if self.proc and self.proc.poll() is None:
+            if self.proc and self.proc.returncode is None:
                 self.proc.terminate()
-                try: self.proc.wait(timeout=2)
+                try: await asyncio.wait_for(self.proc.wait(), 2)
                 except Exception: self.proc.kill()
         except Exception: pass
+        for t in self._tasks: t.cancel()
+        self._fail_pending(RuntimeError("MCP client closed"))
 
-    def _read_loop(self):
-        buf = b""; out = self.proc.stdout
+    async def _read_loop(self):
+        parser = FrameParser(); out = self.proc.stdout
         while True:
-            chunk = out.read(4096)
+            chunk = await out.read(READ_SIZE)
             if not chunk: break
-            buf += chunk
-            while True:
-                m = CONTENT_LEN_RE.search(buf)
-                if not m: break
-                header_end = m.end(); length = int(m.group(1))
-                if len(buf) - header_end < length: break
-                body = buf[header_end:header_end+length]
-                buf = buf[header_end+length:]
-                try: self.q.put(json.loads(body.decode("utf-8","ignore")))
+            with span("mcp.read", "mcp", bytes=len(chunk)):  # framing + JSON decode + dispatch per read
+                for body in parser.feed(chunk):
+                    try: msg = json.loads(body)
+                    except Exception: continue
+                    for m in (msg if isinstance(msg, list) else [msg]):  # JSON-RPC batches too
+                        if isinstance(m, dict): self._dispatch(m)
+        try: await asyncio.wait_for(self.proc.wait(), 1)
+        except Exception: pass
+        self._fail_pending(RuntimeError(f"MCP process exited (stderr: {self._stderr_tail()})"))
+
+    def _dispatch(self, msg):
+        if "method" not in msg:
+            fut = self._pending.pop(msg.get("id"), None)
+            if fut is None or fut.done(): return  # late reply to a cancelled/timed-out request
+            if "error" in msg:
+                err = msg["error"] if isinstance(msg["error"], dict) else {"message": str(msg["error"])}
+                fut.set_exception(MCPError(err.get("message","Unknown MCP error"), err.get("code"), err.get("data")))
+            else: fut.set_result(msg.get("result"))
+            return
+        method, params = msg["method"], msg.get("params") or {}
+        if method == "notifications/tools/list_changed": self._tools = None
+        if "id" in msg:  # server -> client request: answer ping, refuse the rest
+            if method == "ping": self._write({"jsonrpc":"2.0","id":msg["id"],"result":{}})
+            else: self._write({"jsonrpc":"2.0","id":msg["id"],"error":{"code":METHOD_NOT_FOUND,"message":f"Method not found: {method}"}})
+            return
+        if method == "notifications/progress":
+            cb = self._progress.get(params.get("progressToken"))
+            if cb:
+                try: cb(params)
                 except Exception: pass
+        if self.on_notification:
+            try: self.on_notification(method, params)
+            except Exception: pass
+
+    def _fail_pending(self, exc):
+        pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            if not fut.done(): fut.set_exception(exc)
 
-    def _err_loop(self):
+    async def _err_loop(self):
         err = self.proc.stderr
         while True:
-            line = err.readline()
+            line = await err.readline()
             if not line: break
-            try: s = line.decode("utf-8","ignore").rstrip()
-            except Exception: s = str(line)
-            self.stderr_buf.append(s)
+            self.stderr_buf.append(line.decode("utf-8","ignore").rstrip())
+            if len(self.stderr_buf) > 500: del self.stderr_buf[:250]
 
-    def _next_id(self):
-        with self._lock:
-            self._id += 1
-            return self._id
+    def _stderr_tail(self):
+        return " | ".join(self.stderr_buf[-5:]) if self.stderr_buf else "no stderr"
+
+    @property
+    def running(self):
+        # the reader hits EOF the moment the process dies, before returncode is reaped
+        return bool(self.proc and self.proc.returncode is None and self._tasks and not self._tasks[0].done())
 
     def _ensure_running(self):
-        if not self.proc or self.proc.poll() is not None:
-            tail = " | ".join(self.stderr_buf[-5:]) if self.stderr_buf else "no stderr"
-            raise RuntimeError(f"MCP process not running (stderr: {tail})")
+        if not self.running:
+            raise RuntimeError(f"MCP process not running (stderr: {self._stderr_tail()})")
+
+    def _write(self, payload):
+        self.proc.stdin.write(encode_frame(payload, self.framing))  # buffered by the transport, never interleaves
+
+    async def _send(self, payload):
+        self._write(payload)
+        async with self._wlock: await self.proc.stdin.drain()
 
-    def request(self, method, params=None, timeout=15.0):
+    async def request(self, method, params=None, timeout=15.0, on_progress=None):
         self._ensure_running()
-        rid = self._next_id()
+        self._id += 1; rid = self._id
         payload = {"jsonrpc":"2.0","id":rid,"method":method}
         if params is not None: payload["params"] = params
-        data = json.dumps(payload).encode("utf-8")
-        header = f"Content-Length: {len(data)}\r\n\r\n".encode("utf-8")
-        self.proc.stdin.write(header + data); self.proc.stdin.flush()
-
-        end = time.time() + timeout
-        while time.time() < end:
-            try: msg = self.q.get(timeout=0.1)
-            except queue.Empty:
-                self._ensure_running(); continue
-            if isinstance(msg, dict) and msg.get("id") == rid:
-                if "error" in msg: raise RuntimeError(msg["error"].get("message","Unknown MCP error"))
-                return msg.get("result")
-        self._ensure_running()
-        raise TimeoutError(f"MCP request timeout: {method}")
+        if on_progress:
+            payload["params"] = {**(params or {}), "_meta": {"progressToken": rid}}
+            self._progress[rid] = on_progress
+        fut = self._pending[rid] = asyncio.get_running_loop().create_future()
+        t0 = time.perf_counter(); outcome = "error"
+        try:
+            try: await self._send(payload)
+            except Exception as e: raise RuntimeError(f"MCP write failed: {e} (stderr: {self._stderr_tail()})")
+            try: result = await asyncio.wait_for(fut, timeout); outcome = "ok"; return result
+            except asyncio.TimeoutError:
+                outcome = "timeout"; self._cancel_remote(rid, outcome)
+                raise TimeoutError(f"MCP request timeout: {method}")
+            except asyncio.CancelledError:
+                outcome = "cancelled"; self._cancel_remote(rid, outcome)
+                raise
+        finally:
+            self._pending.pop(rid, None); self._progress.pop(rid, None)
+            # requests overlap on the loop thread, so each one is an async span keyed by its id
+            record(method, t0, cat="mcp.rpc", async_id=f"{id(self):x}.{rid}", outcome=outcome, **({"tool": params["name"]} if method in ("tools/call", "tools/execute") else {}))
+
+    def _cancel_remote(self, rid, reason):
+        try: self._write({"jsonrpc":"2.0","method":"notifications/cancelled","params":{"requestId":rid,"reason":reason}})
+        except Exception: pass
+
+    async def _dialect_request(self, kind, params=None, timeout=15.0, on_progress=None):
+        # Only a JSON-RPC "method not found" moves us to the other dialect; timeouts and
+        # tool errors are raised as-is so a slow call is never re-executed.
+        order = [self.dialect] if self.dialect else ["mcp", "legacy"]
+        for i, name in enumerate(order):
+            try: result = await self.request(DIALECTS[name][kind], params, timeout=timeout, on_progress=on_progress)
+            except MCPError as e:
+                if e.code != METHOD_NOT_FOUND or i == len(order) - 1: raise
+                continue
+            self.dialect = name
+            return result
+
+    async def list_tools(self, refresh=False):
+        if self._tools is None or refresh:
+            self._tools = (await self._dialect_request("list"))["tools"]
+        return self._tools
 
-    def list_tools(self):
-        try: return self.request("tools/list")["tools"]
-        except Exception: return self.request("tools.list")["tools"]
+    def tool_schema(self, name):
+        for t in self._tools or ():
+            if t.get("name") == name: return t.get("inputSchema")
+        return None
 
-    def call_tool(self, name, arguments=None):
+    async def call_tool(self, name, arguments=None, timeout=15.0, on_progress=None):
         arguments = arguments or {}
-        try: return self.request("tools/call", {"name":name,"arguments":arguments})
-        except Exception: return self.request("tools/execute", {"name":name,"arguments":arguments})
+        return await self._dialect_request("call", {"name":name,"arguments":arguments}, timeout=timeout, on_progress=on_progress)
+
+
+class MCPClient:
+    # blocking facade over AsyncMCPClient: the async client runs on a private event loop
+    # thread and every call is a run_coroutine_threadsafe() round-trip
+    def __init__(self, cmd, cwd=None, env=None, framing="content-length"):
+        self.aio = AsyncMCPClient(cmd, cwd=cwd, env=env, framing=framing)
+        self.cmd = self.aio.cmd
+        self._loop = None
+        self._thread = None
+
+    @property
+    def proc(self): return self.aio.proc
+
+    @property
+    def stderr_buf(self): return self.aio.stderr_buf
+
+    @property
+    def server_info(self): return self.aio.server_info
+
+    @property
+    def running(self): return self._loop is not None and self.aio.running
+
+    @property
+    def on_notification(self): return self.aio.on_notification
+
+    @on_notification.setter
+    def on_notification(self, cb): self.aio.on_notification = cb  # runs on the loop thread
+
+    def _run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def start(self, timeout=15.0):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f"mcp-loop {self.cmd[-1]}", daemon=True)
+        self._thread.start()
+        self._run(self.aio.start(timeout), timeout=timeout + 5)
+
+    def close(self):
+        if not self._loop: return
+        try: self._run(self.aio.close(), timeout=5)
+        except Exception: pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2)
+        self._loop = None
+
+    def _ensure_running(self):
+        if not self._loop: raise RuntimeError("MCP process not running (not started)")
+        self.aio._ensure_running()
+
+    def submit(self, method, params=None, timeout=15.0, on_progress=None):
+        # Fire a request and return a concurrent.futures.Future; safe from any thread.
+        self._ensure_running()
+        return asyncio.run_coroutine_threadsafe(self.aio.request(method, params, timeout, on_progress), self._loop)
+
+    def cancel(self, fut, reason=None):
+        # Cancels the request task, which sends notifications/cancelled to the server.
+        return fut.cancel()
+
+    def request(self, method, params=None, timeout=15.0, on_progress=None):
+        try: return self.submit(method, params, timeout, on_progress).result()
+        except CancelledError: raise RuntimeError(f"MCP request cancelled: {method}")
+
+    def list_tools(self, refresh=False):
+        self._ensure_running()
+        if self.aio._tools is not None and not refresh: return self.aio._tools  # no loop round-trip
+        return self._run(self.aio.list_tools(refresh))
+
+    def tool_schema(self, name): return self.aio.tool_schema(name)
+
+    def call_tool(self, name, arguments=None, timeout=15.0, on_progress=None):
+        self._ensure_running()
+        return self._run(self.aio.call_tool(name, arguments, timeout=timeout, on_progress=on_progress))
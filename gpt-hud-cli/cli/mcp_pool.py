@@ -0,0 +1,286 @@
+# mcp_pool.py — supervised MCP servers: several commands, N replica processes each
+# Tool calls are routed to the server whose catalog lists the tool and go to the
+# replica with the fewest calls in flight; when every replica is at its concurrency
+# limit the call queues. A supervisor thread restarts replicas whose process died
+# (exponential backoff, reset once a replica has stayed up for a while); a restart
+# replays the initialize handshake and refreshes the tool catalog.
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from mcp_client import MCPClient
+from metrics import percentile
+
+STABLE_AFTER = 60.0  # seconds up before a replica's restart backoff resets
+
+
+class Replica:
+    def __init__(self, server, n):
+        self.server = server
+        self.n = n
+        self.client = None
+        self.state = "stopped"  # starting | ready | dead | stopped
+        self.inflight = 0
+        self.restarts = 0
+        self.error = None
+        self.up_since = None
+        self.backoff = 0.0
+        self.retry_at = 0.0
+
+    @property
+    def alive(self):
+        return self.state == "ready" and self.client is not None and self.client.running
+
+    def start(self, timeout):
+        self.state = "starting"
+        client = MCPClient(self.server.cmd, env=self.server.env, framing=self.server.framing)
+        try:
+            client.start(timeout=timeout)
+        except Exception as e:
+            client.close()
+            self.state, self.error = "dead", str(e)
+            raise
+        try:
+            self.server.tools = client.list_tools()  # warmed by initialize: no round-trip
+        except Exception:
+            pass
+        self.client, self.state, self.error = client, "ready", None
+        self.up_since = time.monotonic()
+        return client
+
+    def died(self, now):
+        # schedule the restart: quick after a long healthy run, backing off when crash-looping
+        stable = self.up_since is not None and now - self.up_since >= STABLE_AFTER
+        self.backoff = 1.0 if stable or not self.backoff else min(self.server.max_backoff, self.backoff * 2)
+        self.retry_at = now + self.backoff
+        self.state, self.up_since = "dead", None
+
+    def stop(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.state = "stopped"
+
+
+class MCPServer:
+    def __init__(self, name, cmd, replicas=1, framing="content-length", env=None, concurrency=4, max_backoff=30.0):
+        self.name = name
+        self.cmd = cmd
+        self.framing = framing
+        self.env = env
+        self.concurrency = max(1, concurrency)  # calls in flight per replica
+        self.max_backoff = max_backoff
+        self.replicas = [Replica(self, n) for n in range(max(1, replicas))]
+        self.waiting = 0
+        self.calls = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=256)
+        self.tools = None  # last tools/list result from any replica
+        self._cv = threading.Condition()
+
+    @classmethod
+    def from_dict(cls, d, n, framing="content-length", concurrency=4, max_backoff=30.0):
+        env = {k: str(v) for k, v in (d.get("env") or {}).items()}
+        return cls(d.get("name") or f"mcp-{n}", d["cmd"], replicas=int(d.get("replicas") or 1),
+                   framing=(d.get("framing") or framing).lower(), env=env,
+                   concurrency=int(d.get("concurrency") or concurrency), max_backoff=max_backoff)
+
+    def live(self):
+        return [r for r in self.replicas if r.alive]
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cv:
+            self.waiting += 1
+            try:
+                while True:
+                    free = [r for r in self.replicas if r.alive and r.inflight < self.concurrency]
+                    if free:
+                        r = min(free, key=lambda r: r.inflight)
+                        r.inflight += 1
+                        return r
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        if not self.live():
+                            errors = "; ".join(sorted({r.error for r in self.replicas if r.error})) or "not started"
+                            raise RuntimeError(f"MCP server {self.name}: no replica running ({errors})")
+                        raise TimeoutError(f"MCP server {self.name}: all replicas busy for {timeout:g}s")
+                    self._cv.wait(min(left, 0.25))  # also wakes up for replicas the supervisor restarts
+            finally:
+                self.waiting -= 1
+
+    def call_tool(self, name, arguments=None, timeout=15.0):
+        # time spent queueing counts against the call's timeout. A replica found dead
+        # before the request went out is skipped; a call that was sent is never retried.
+        t0 = time.monotonic()
+        while True:
+            r = self._acquire(max(0.0, timeout - (time.monotonic() - t0)))
+            done = True
+            try:
+                return r.client.call_tool(name, arguments, timeout=max(0.1, timeout - (time.monotonic() - t0)))
+            except RuntimeError as e:
+                if str(e).startswith(("MCP process not running", "MCP write failed")):
+                    done = False
+                    continue
+                self.errors += 1
+                raise
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                with self._cv:
+                    r.inflight -= 1
+                    if done:
+                        self.calls += 1
+                        self.latencies.append(time.monotonic() - t0)
+                    self._cv.notify()
+
+    def stats(self):
+        lat = sorted(self.latencies)
+        return {"name": self.name, "up": len(self.live()), "replicas": len(self.replicas),
+                "queue": self.waiting, "inflight": sum(r.inflight for r in self.replicas),
+                "calls": self.calls, "errors": self.errors, "restarts": sum(r.restarts for r in self.replicas),
+                "p50": percentile(lat, 0.5), "p95": percentile(lat, 0.95),
+                "error": next((r.error for r in self.replicas if r.error), None)}
+
+
+class MCPPool:
+    # same calls as MCPClient (start / list_tools / tool_schema / call_tool / close)
+    def __init__(self, servers, start_timeout=15.0):
+        self.servers = servers
+        self.start_timeout = start_timeout
+        self._routes = {}  # tool name as listed -> (server, tool name on that server)
+        self._catalog = None
+        self._sources = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._supervisor = None
+
+    @classmethod
+    def from_config(cls, spec, cmd=None, replicas=1, framing="content-length", concurrency=4,
+                    max_backoff=30.0, start_timeout=15.0):
+        # spec: JSON list (inline, or a path to a .json file) of {"name", "cmd", "replicas",
+        # "concurrency", "framing", "env"}; empty -> the single MCP_CMD server. None if neither.
+        spec = (spec or "").strip()
+        kw = {"framing": framing, "concurrency": concurrency, "max_backoff": max_backoff}
+        if spec:
+            if not spec.startswith("["):
+                with open(os.path.expanduser(spec), "r", encoding="utf-8") as f:
+                    spec = f.read()
+            servers = [MCPServer.from_dict(d, n, **kw) for n, d in enumerate(json.loads(spec), 1)]
+        elif cmd:
+            servers = [MCPServer("mcp", cmd, replicas=replicas, **kw)]
+        else:
+            return None
+        return cls(servers, start_timeout=start_timeout)
+
+    # ---- lifecycle ----------------------------------------------------------------
+    def start(self, timeout=None):
+        # spawn every replica concurrently; fails only if no server came up at all
+        timeout = timeout or self.start_timeout
+        errors = []
+
+        def boot(r):
+            try:
+                r.start(timeout)
+            except Exception as e:
+                errors.append(f"{r.server.name}: {e}")
+                r.died(time.monotonic())
+
+        threads = [threading.Thread(target=boot, args=(r,), daemon=True)
+                   for s in self.servers for r in s.replicas]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout + 5)
+        self._supervisor = threading.Thread(target=self._supervise, name="mcp-supervisor", daemon=True)
+        self._supervisor.start()
+        if not any(s.live() for s in self.servers):
+            raise RuntimeError("; ".join(errors) or "no MCP server started")
+
+    def _supervise(self):
+        while not self._closed.wait(0.5):
+            now = time.monotonic()
+            for s in self.servers:
+                for r in s.replicas:
+                    if r.state == "ready" and not r.alive:
+                        code = r.client.proc.returncode if r.client and r.client.proc else None
+                        r.error = "process exited" + (f" with code {code}" if code is not None else "")
+                        r.died(now)
+                    elif r.state == "dead" and now >= r.retry_at:
+                        r.state = "starting"
+                        threading.Thread(target=self._restart, args=(r,), daemon=True).start()
+
+    def _restart(self, r):
+        if r.client is not None:
+            r.client.close()
+            r.client = None
+        r.restarts += 1
+        try:
+            r.start(self.start_timeout)
+        except Exception:
+            r.died(time.monotonic())
+            return
+        if self._closed.is_set():
+            r.stop()
+            return
+        with r.server._cv:
+            r.server._cv.notify_all()  # queued calls can go now
+
+    def close(self):
+        self._closed.set()
+        for s in self.servers:
+            for r in s.replicas:
+                r.stop()
+
+    # ---- tools ----------------------------------------------------------------------
+    def list_tools(self, refresh=False):
+        # merged catalog; a tool name already taken by an earlier server is listed as
+        # "<server>.<tool>". Rebuilt when any server's catalog object changes.
+        with self._lock:
+            sources = []
+            for s in self.servers:
+                live = s.live()
+                try:
+                    if live:
+                        s.tools = live[0].client.list_tools(refresh=refresh)
+                except Exception:
+                    pass
+                sources.append(s.tools)  # a server that is down keeps its last catalog, so routes stay put
+            if self._catalog is not None and not refresh and all(
+                    a is b for a, b in zip(sources, self._sources)):
+                return self._catalog
+            catalog, routes = [], {}
+            for s, tools in zip(self.servers, sources):
+                for t in tools or ():
+                    name = t.get("name")
+                    listed = name if name not in routes else f"{s.name}.{name}"
+                    routes[listed] = (s, name)
+                    catalog.append(t if listed == name else {**t, "name": listed})
+            self._catalog, self._routes, self._sources = catalog, routes, sources
+            return catalog
+
+    def tool_schema(self, name):
+        self.list_tools()
+        for t in self._catalog or ():
+            if t.get("name") == name:
+                return t.get("inputSchema")
+        return None
+
+    def call_tool(self, name, arguments=None, timeout=15.0):
+        route = self._routes.get(name)
+        if route is None:
+            self.list_tools()
+            route = self._routes.get(name)
+        if route is None:
+            if len(self.servers) != 1:
+                raise LookupError(f"no MCP server lists a tool named {name!r}")
+            route = (self.servers[0], name)  # single server: let it answer for unlisted tools
+        server, tool = route
+        return server.call_tool(tool, arguments or {}, timeout=timeout)
+
+    def stats(self):
+        return [s.stats() for s in self.servers]
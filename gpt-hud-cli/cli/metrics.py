@@ -0,0 +1,178 @@
+# metrics.py — per-request latency metrics on a monotonic clock
+# A RequestTimer is started right before the HTTP call and fed by the stream loop:
+#   headers  time until the response headers arrived (connection setup + server queueing)
+#   ttft     time to the first text delta
+#   total    time until the stream was fully read
+#   tok/s    completion tokens / (total - ttft), i.e. generation speed after the first token
+#   gaps     p50/p95/p99 of the time between consecutive deltas
+# Records can be appended to a JSONL file or summarised into a Prometheus textfile.
+# The sink keeps no records: quantiles come from a bounded uniform sample per metric
+# (count and sum stay exact), so memory is flat over a 100k-prompt batch or a daemon.
+
+import json
+import math
+import os
+import random
+import time
+
+QUANTILES = (0.5, 0.95, 0.99)
+RESERVOIR = 4096  # values sampled per metric (and model) for the quantiles
+SUMMARY_KEYS = ("headers_s", "ttft_s", "total_s", "tokens_per_s", "gap_p95_s")
+
+
+def percentile(sorted_vals, q):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_vals:
+        return None
+    i = min(len(sorted_vals) - 1, max(0, math.ceil(q * len(sorted_vals)) - 1))
+    return sorted_vals[i]
+
+
+class RequestTimer:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.headers = None
+        self.ttft = None
+        self.total = None
+        self._last = None
+        self.gaps = []
+
+    def got_headers(self):
+        self.headers = time.perf_counter() - self.t0
+
+    def delta(self):
+        now = time.perf_counter()
+        if self._last is None:
+            self.ttft = now - self.t0
+        else:
+            self.gaps.append(now - self._last)
+        self._last = now
+
+    def finish(self):
+        self.total = time.perf_counter() - self.t0
+        return self
+
+    def record(self, model, completion_tokens=0, **extra):
+        # -> flat dict (seconds), one per request
+        total = self.total if self.total is not None else time.perf_counter() - self.t0
+        gen = total - self.ttft if self.ttft is not None else None
+        gaps = sorted(self.gaps)
+        rec = {
+            "ts": round(time.time(), 3),
+            "model": model,
+            "headers_s": _r(self.headers),
+            "ttft_s": _r(self.ttft),
+            "total_s": _r(total),
+            "completion_tokens": completion_tokens or 0,
+            "tokens_per_s": round(completion_tokens / gen, 1) if completion_tokens and gen else None,
+            "deltas": len(self.gaps) + (self._last is not None),
+        }
+        for q in QUANTILES:
+            rec[f"gap_p{int(q * 100)}_s"] = _r(percentile(gaps, q))
+        rec.update(extra)
+        return rec
+
+
+def _r(v):
+    return None if v is None else round(v, 4)
+
+
+def fmt_ms(v):
+    if v is None:
+        return "-"
+    ms = v * 1000
+    return f"{ms:.1f}ms" if ms < 10 else f"{ms:.0f}ms"
+
+
+class Reservoir:
+    # uniform sample of a stream of values (Algorithm R)
+    def __init__(self, size=RESERVOIR):
+        self.size = size
+        self.vals = []
+        self.count = 0
+        self.sum = 0.0
+        self._rng = random.Random(0)
+
+    def add(self, v):
+        self.count += 1
+        self.sum += v
+        if len(self.vals) < self.size:
+            self.vals.append(v)
+        else:
+            j = self._rng.randrange(self.count)
+            if j < self.size:
+                self.vals[j] = v
+
+    def quantiles(self):
+        vals = sorted(self.vals)
+        return {f"p{int(q * 100)}": percentile(vals, q) for q in QUANTILES}
+
+
+class MetricsSink:
+    # Aggregates records for the session summary; with a path ending in .prom the
+    # summary is written as a Prometheus textfile on close, any other path gets one
+    # JSON line per request as it happens.
+    def __init__(self, path=None):
+        self.path = path
+        self.prom = bool(path) and path.endswith(".prom")
+        self.requests = 0
+        self.totals = {}  # metric -> Reservoir, across models
+        self.by_model = {}  # model -> {metric -> Reservoir}
+        self._f = open(path, "a", encoding="utf-8") if path and not self.prom else None
+
+    def add(self, rec):
+        self.requests += 1
+        model = self.by_model.setdefault(rec.get("model") or "unknown", {})
+        for key in SUMMARY_KEYS:
+            v = rec.get(key)
+            if v is not None:
+                self.totals.setdefault(key, Reservoir()).add(v)
+                model.setdefault(key, Reservoir()).add(v)
+        if self._f is not None:
+            self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._f.flush()
+
+    def summary(self):
+        # {metric: {"p50": v, "p95": v, "p99": v}, "requests": n}
+        out = {"requests": self.requests}
+        for key, res in self.totals.items():
+            out[key] = res.quantiles()
+        return out
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        elif self.prom:
+            write_prometheus(self.path, self.by_model)
+
+
+def write_prometheus(path, by_model, prefix="gpt_hud"):
+    # by_model: {model: {metric: Reservoir}}. Textfile-collector format
+    # (node_exporter --collector.textfile), written atomically.
+    if not path or not by_model:
+        return
+    metrics = (
+        ("headers_s", "request_headers_seconds", "Time until response headers (connect + queueing)"),
+        ("ttft_s", "time_to_first_token_seconds", "Time to first streamed token"),
+        ("total_s", "request_duration_seconds", "Total request time"),
+        ("tokens_per_s", "output_tokens_per_second", "Completion tokens per second after the first token"),
+        ("gap_p95_s", "inter_token_gap_p95_seconds", "Per-request p95 gap between streamed deltas"),
+    )
+    lines = []
+    for key, name, help_ in metrics:
+        lines.append(f"# HELP {prefix}_{name} {help_}")
+        lines.append(f"# TYPE {prefix}_{name} summary")
+        for model, stats in sorted(by_model.items()):
+            res = stats.get(key)
+            if res is None or not res.count:
+                continue
+            label = model.replace("\\", "\\\\").replace('"', '\\"')
+            for q, v in zip(QUANTILES, res.quantiles().values()):
+                lines.append(f'{prefix}_{name}{{model="{label}",quantile="{q}"}} {v}')
+            lines.append(f'{prefix}_{name}_sum{{model="{label}"}} {round(res.sum, 6)}')
+            lines.append(f'{prefix}_{name}_count{{model="{label}"}} {res.count}')
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
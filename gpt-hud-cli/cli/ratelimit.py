@@ -0,0 +1,185 @@
+# ratelimit.py — client-side admission control from provider rate-limit headers
+# One requests bucket and one tokens bucket per key (an Azure deployment, or an OpenAI
+# base URL + model), refilled continuously and resynchronised from x-ratelimit-* headers
+# after every response. A request waits until both buckets cover it (predicted prompt
+# tokens + max_tokens) and any Retry-After block has passed. State lives in a small JSON
+# file under an flock, so parallel invocations (several batch runs, a REPL next to a
+# script) draw from one budget.
+
+import json
+import os
+import random
+import re
+import threading
+import time
+
+try:
+    import fcntl  # POSIX; elsewhere the budget is only shared within the process
+except Exception:
+    fcntl = None
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "gpt-hud", "ratelimit.json")
+STALE_AFTER = 3600  # forget buckets not touched for an hour
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def parse_duration(v):
+    # "1s", "6m0s", "250ms", "20" (seconds) -> seconds, or None
+    if v is None:
+        return None
+    v = str(v).strip()
+    try:
+        return float(v)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(v)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+
+def retry_after(headers):
+    # seconds the server asked us to wait (retry-after-ms, retry-after), or None
+    if headers is None:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms is not None:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    v = headers.get("retry-after")
+    if v is None:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        from email.utils import parsedate_to_datetime  # HTTP-date form
+        try:
+            return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+        except Exception:
+            return None
+
+
+def backoff(attempt, hint=None, base=0.5, cap=30.0):
+    # never sooner than the server's Retry-After; jitter spreads out parallel clients
+    if hint is not None:
+        return hint + random.uniform(0, min(1.0, 0.2 * hint + 0.1))
+    return random.uniform(0.5, 1.0) * min(cap, base * (2 ** attempt))
+
+
+class RateLimiter:
+    def __init__(self, path=None, rpm=0, tpm=0, max_wait=60.0):
+        self.path = os.path.expanduser(path or DEFAULT_PATH)  # one file per user, whatever the cwd
+        self.rpm = rpm  # static limits for endpoints that send no headers; 0 = unknown
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self.waited = 0.0  # total seconds spent waiting for admission (this process)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    # ---- shared state -------------------------------------------------------------
+    def _update_state(self, fn):
+        # read-modify-write the state file under an exclusive lock; fn(state) -> result
+        with self._lock, open(self.path, "a+", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw.strip() else {}
+                except ValueError:
+                    state = {}  # torn write from a killed process: start over
+                result = fn(state)
+                now = time.time()
+                state = {k: v for k, v in state.items() if now - v.get("t", now) < STALE_AFTER}
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state, separators=(",", ":")))
+                f.flush()
+                return result
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _entry(self, state, key):
+        e = state.get(key)
+        if e is None:
+            e = state[key] = {"t": time.time(), "blocked": 0.0}
+            if self.rpm:
+                e["req"] = {"cap": self.rpm, "level": float(self.rpm), "rate": self.rpm / 60.0, "t": time.time()}
+            if self.tpm:
+                e["tok"] = {"cap": self.tpm, "level": float(self.tpm), "rate": self.tpm / 60.0, "t": time.time()}
+        e["t"] = time.time()
+        return e
+
+    @staticmethod
+    def _refill(b, now):
+        b["level"] = min(b["cap"], b["level"] + (now - b["t"]) * b["rate"])
+        b["t"] = now
+
+    # ---- admission ----------------------------------------------------------------
+    def acquire(self, key, tokens):
+        # block until one request of `tokens` fits; gives up waiting after max_wait
+        # (the server then gets the final say). Returns seconds waited.
+        start = time.monotonic()
+
+        def take(state):
+            now = time.time()
+            e = self._entry(state, key)
+            wait = e.get("blocked", 0.0) - now
+            for name, need in (("req", 1), ("tok", tokens)):
+                b = e.get(name)
+                if b is None:
+                    continue
+                self._refill(b, now)
+                need = min(need, b["cap"])  # a single oversized request still gets through
+                if b["level"] < need:
+                    wait = max(wait, (need - b["level"]) / b["rate"] if b["rate"] > 0 else 1.0)
+            if wait > 0:
+                return wait
+            for name, need in (("req", 1), ("tok", tokens)):
+                if name in e:
+                    e[name]["level"] -= min(need, e[name]["cap"])
+            return 0.0
+
+        while True:
+            wait = self._update_state(take)
+            elapsed = time.monotonic() - start
+            if wait <= 0 or elapsed >= self.max_wait:
+                self.waited += elapsed
+                return elapsed
+            time.sleep(min(wait, self.max_wait - elapsed, 2.0) + random.uniform(0, 0.05))
+
+    def update(self, key, headers, status=None):
+        # resync buckets from x-ratelimit-* headers; a 429 (or Retry-After) blocks the key
+        if headers is None:
+            return
+        hint = retry_after(headers)
+
+        def apply(state):
+            now = time.time()
+            e = self._entry(state, key)
+            for name, kind in (("req", "requests"), ("tok", "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                    # Azure sends only the remaining counts: keep the largest level seen as the cap
+                    limit = float(headers.get(f"x-ratelimit-limit-{kind}") or max(remaining, e.get(name, {}).get("cap", 0)))
+                except ValueError:
+                    continue
+                if limit <= 0:
+                    continue
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                # refill speed: what is missing comes back by the reset time, else a minute window
+                rate = (limit - remaining) / reset if reset and limit > remaining else limit / 60.0
+                e[name] = {"cap": limit, "level": remaining, "rate": max(rate, limit / 3600.0), "t": now}
+            if hint is not None or status == 429:
+                e["blocked"] = max(e.get("blocked", 0.0), now + (hint if hint is not None else 1.0))
+
+        self._update_state(apply)
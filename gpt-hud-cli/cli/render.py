@@ -0,0 +1,154 @@
+# render.py — frame-rate-limited live renderer for streamed assistant output
+# The network loop only appends deltas to a buffer (push never touches the terminal);
+# a separate render thread redraws at most `fps` times a second. Finished lines (plain)
+# or finished Markdown blocks are committed above the Live region once and never
+# re-rendered, so each frame only re-parses the tail of the message.
+
+import threading
+
+from rich.console import Group
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.text import Text
+
+from spans import span
+
+FENCE = "```"
+
+
+class LiveRenderer:
+    def __init__(self, console, title=None, fps=15, markdown=False):
+        self.console = console
+        self.title = title
+        self.fps = max(1.0, float(fps))
+        self.markdown = markdown
+        self._parts = []
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._text = ""  # everything pushed so far (joined lazily by the render thread)
+        self._committed = 0  # chars of _text already printed above the live region
+        self._fences = 0  # ``` count inside the committed text (odd = inside a code block)
+        self._titled = False
+        self._live = None
+        self._thread = None
+        self.frames = 0
+
+    # ---- producer side (network thread) ---------------------------------------
+    def push(self, delta):
+        with self._lock:
+            self._parts.append(delta)
+        self._dirty.set()
+
+    # ---- lifecycle --------------------------------------------------------------
+    def __enter__(self):
+        if self.console.is_terminal:
+            self._live = Live(
+                Text(""), console=self.console, auto_refresh=False,
+                transient=True, vertical_overflow="visible",
+            )
+            self._live.start()
+        self._thread = threading.Thread(target=self._run, name="render", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._dirty.set()
+        self._thread.join()
+        self._drain()
+        with span("render.flush", "render"):
+            self._commit(len(self._text))  # whatever is left is final
+        if self._live is not None:
+            self._live.update(Text(""), refresh=True)
+            self._live.stop()
+        if not self._titled and self.title:
+            self.console.print(self.title)  # empty reply: still show who answered
+        return False
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        while not self._stop.is_set():
+            self._dirty.wait()
+            if self._stop.is_set():
+                break
+            self._dirty.clear()
+            self._drain()
+            self._frame()
+            self._stop.wait(interval)  # frame cap: deltas keep piling up in _parts meanwhile
+
+    def _drain(self):
+        with self._lock:
+            parts, self._parts = self._parts, []
+        if parts:
+            self._text += "".join(parts)
+
+    # ---- drawing (render thread only) -------------------------------------------
+    def _frame(self):
+        self.frames += 1
+        with span("render.frame", "render", chars=len(self._text) - self._committed):
+            self._commit(self._stable_end())
+            if self._live is not None:
+                self._live.update(self._tail_renderable(), refresh=True)
+
+    def _stable_end(self):
+        # plain: up to the last newline; markdown: up to the last blank line that is
+        # not inside a fenced code block
+        text = self._text
+        if not self.markdown:
+            return text.rfind("\n", self._committed) + 1 or self._committed
+        pos, fences, end = self._committed, self._fences, self._committed
+        while True:
+            nl = text.find("\n\n", pos)
+            f = text.find(FENCE, pos)
+            if f != -1 and (nl == -1 or f < nl):
+                fences += 1
+                pos = f + len(FENCE)
+                continue
+            if nl == -1:
+                return end
+            if fences % 2 == 0:
+                end = nl + 2
+            pos = nl + 2
+
+    def _commit(self, end):
+        if end <= self._committed:
+            return
+        block = self._text[self._committed:end]
+        self._fences += block.count(FENCE)
+        self._committed = end
+        if self.markdown:
+            if not self._titled and self.title:
+                self._print(Text.from_markup(self.title))
+                self._titled = True
+            if block.strip():
+                self._print(Markdown(block))
+        else:
+            line = Text(block[:-1] if block.endswith("\n") else block)
+            if not self._titled and self.title:
+                line = Text.assemble(Text.from_markup(self.title + " "), line)
+                self._titled = True
+            self._print(line)
+
+    def _print(self, renderable):
+        if self._live is not None:
+            self._live.console.print(renderable)  # lands above the live region
+        elif isinstance(renderable, Text):
+            self.console.file.write(renderable.plain + "\n")
+            self.console.file.flush()
+        else:
+            self.console.print(renderable)
+
+    def _tail_renderable(self):
+        tail = self._text[self._committed:]
+        if self.markdown:
+            parts = []
+            if not self._titled and self.title:
+                parts.append(Text.from_markup(self.title))
+            if tail.strip():
+                # still inside an open code fence? close it so the preview renders as code
+                parts.append(Markdown(tail + ("\n" + FENCE if (self._fences + tail.count(FENCE)) % 2 else "")))
+            return Group(*parts)
+        if not self._titled and self.title:
+            return Text.assemble(Text.from_markup(self.title + " "), tail)
+        return Text(tail)
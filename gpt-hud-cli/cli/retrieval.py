@@ -0,0 +1,294 @@
+# retrieval.py — local chunk index for large /attach targets (files or whole directories)
+# Files are memory-mapped and cut into line-aligned chunks; terms go into an on-disk
+# inverted index (sqlite, stdlib only) scored with BM25. Re-indexing is incremental:
+# unchanged mtime/size -> skipped, changed mtime but same sha256 -> only restamped.
+# Directory walks leave out hidden files, secret-looking files (keys, certificates,
+# .env) and anything .gitignore'd, since retrieved chunks are sent to the provider;
+# include_hidden=True opts back in. A file attached by name is always indexed.
+
+import fnmatch
+import hashlib
+import math
+import mmap
+import os
+import re
+import sqlite3
+from collections import Counter
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "gpt-hud", "index.sqlite")
+CHUNK_BYTES = 2000  # target chunk size; chunks always end on a line boundary
+SNIFF_BYTES = 8192  # a NUL in the first block marks the file as binary
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".mypy_cache", ".pytest_cache"}
+SECRET_FILES = ("*.pem", "*.key", "*.p12", "*.pfx", "*.jks", "*.keystore", "*.kdbx", "*.asc", "*.gpg",
+                "id_rsa*", "id_dsa*", "id_ecdsa*", "id_ed25519*", "*.env", "env.*", "credentials*", "secrets.*")
+K1, B = 1.2, 0.75
+BINARY = "-"  # sha placeholder: remembered so binaries are not re-sniffed on every update
+
+_TERMS = re.compile(r"[A-Za-z_][A-Za-z0-9_]+|\d{2,}")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, sha TEXT);
+CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, path TEXT, start INTEGER, end INTEGER,
+                                   line INTEGER, nterms INTEGER);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks(path);
+CREATE TABLE IF NOT EXISTS postings (term TEXT, chunk INTEGER, tf INTEGER);
+CREATE INDEX IF NOT EXISTS postings_term ON postings(term);
+CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk);
+"""
+
+
+def terms(text):
+    # identifiers are indexed whole and by their snake_case parts: "read_text_file"
+    # matches queries for "read_text_file" as well as "text file"
+    out = []
+    for w in _TERMS.findall(text.lower()):
+        out.append(w)
+        if "_" in w:
+            out.extend(p for p in w.split("_") if len(p) > 1)
+    return out
+
+
+def _scope(roots):
+    # SQL filter for chunks under any of the attached roots
+    clause = " OR ".join("(c.path = ? OR substr(c.path, 1, ?) = ?)" for _ in roots)
+    args = []
+    for r in roots:
+        prefix = r.rstrip(os.sep) + os.sep
+        args += [r, len(prefix), prefix]
+    return f"({clause})", args
+
+
+def _glob_re(pat):
+    # gitignore glob -> regex over "/"-separated relative paths
+    out, i = [], 0
+    while i < len(pat):
+        if pat.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pat.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pat[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pat[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pat[i] == "[" and "]" in pat[i + 1:]:
+            j = pat.index("]", i + 1)
+            out.append("[" + pat[i + 1:j].replace("!", "^", 1) + "]")
+            i = j + 1
+        else:
+            out.append(re.escape(pat[i]))
+            i += 1
+    return "".join(out)
+
+
+def _gitignore(d):
+    # -> [(regex, negated, dir_only)] from d/.gitignore
+    rules = []
+    try:
+        with open(os.path.join(d, ".gitignore"), "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        neg = line.startswith("!")
+        line = line[neg:]
+        dir_only = line.endswith("/")
+        anchored = "/" in line.rstrip("/")  # "a/b" and "/a" are relative to d; "a" matches at any depth
+        line = line.strip("/")
+        if not line:
+            continue
+        rx = _glob_re(line) if anchored else "(?:.*/)?" + _glob_re(line)
+        rules.append((re.compile(rx + "$"), neg, dir_only))
+    return rules
+
+
+def _ignored(rules, path, is_dir):
+    # rules: [(base dir, rules of its .gitignore)], outermost first; the last match wins
+    hit = False
+    for base, rs in rules:
+        rel = os.path.relpath(path, base).replace(os.sep, "/")
+        for rx, neg, dir_only in rs:
+            if (is_dir or not dir_only) and rx.match(rel):
+                hit = not neg
+    return hit
+
+
+def _secret(name):
+    return any(fnmatch.fnmatch(name.lower(), p) for p in SECRET_FILES)
+
+
+def _chunks(mm):
+    # -> (start, end, first line) spans over a mapped file
+    pos, line, size = 0, 1, len(mm)
+    while pos < size:
+        nl = mm.find(b"\n", min(pos + CHUNK_BYTES, size - 1))
+        end = size if nl == -1 else nl + 1
+        yield pos, end, line
+        line += mm[pos:end].count(b"\n")
+        pos = end
+
+
+class ChunkIndex:
+    def __init__(self, path=None, include_hidden=False):
+        self.path = os.path.expanduser(path or DEFAULT_PATH)
+        self.include_hidden = include_hidden  # also index dotfiles, key files and .gitignore'd paths
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # ---- indexing -----------------------------------------------------------------
+    def _walk(self, root):
+        if os.path.isfile(root):
+            yield root
+            return
+        inherited = {root: []}  # dir -> .gitignore rules that apply inside it
+        for d, dirs, files in os.walk(root):
+            rules = inherited.pop(d, [])
+            if not self.include_hidden:
+                own = _gitignore(d)
+                rules = rules + [(d, own)] if own else rules
+            keep = []
+            for x in sorted(dirs):
+                if x in SKIP_DIRS or x.startswith("."):
+                    continue
+                if not self.include_hidden and _ignored(rules, os.path.join(d, x), True):
+                    continue
+                keep.append(x)
+                inherited[os.path.join(d, x)] = rules
+            dirs[:] = keep
+            for f in sorted(files):
+                path = os.path.join(d, f)
+                if not self.include_hidden and (f.startswith(".") or _secret(f) or _ignored(rules, path, False)):
+                    continue
+                yield path
+
+    def update(self, root):
+        # (Re)index everything under root. Returns {"files", "indexed", "restamped", "removed", "chunks"}.
+        root = os.path.abspath(root)
+        where, args = _scope([root])
+        known = {p: (m, s, h) for p, m, s, h in self.db.execute(
+            f"SELECT path, mtime, size, sha FROM files c WHERE {where}", args)}
+        stats = {"files": 0, "indexed": 0, "restamped": 0, "removed": 0, "chunks": 0}
+        seen = set()
+        with self.db:
+            for path in self._walk(root):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+                old = known.get(path)
+                if old and old[0] == st.st_mtime and old[1] == st.st_size:
+                    stats["files"] += old[2] != BINARY
+                    continue
+                n = self._index_file(path, st, old)
+                if n is None:
+                    continue  # binary or unreadable
+                stats["files"] += 1
+                if n < 0:
+                    stats["restamped"] += 1
+                else:
+                    stats["indexed"] += 1
+                    stats["chunks"] += n
+            for path in set(known) - seen:
+                self._drop(path)
+                stats["removed"] += 1
+        return stats
+
+    def _drop(self, path):
+        self.db.execute("DELETE FROM postings WHERE chunk IN (SELECT id FROM chunks WHERE path = ?)", (path,))
+        self.db.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _index_file(self, path, st, old):
+        # -> chunks written, -1 if only the mtime changed, None if skipped
+        try:
+            with open(path, "rb") as f:
+                if st.st_size == 0:
+                    mm = b""
+                else:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    if b"\0" in mm[:SNIFF_BYTES]:
+                        self._drop(path)
+                        self.db.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (path, st.st_mtime, st.st_size, BINARY))
+                        return None
+                    sha = hashlib.sha256(mm).hexdigest()
+                    if old and old[2] == sha:
+                        self.db.execute("UPDATE files SET mtime = ?, size = ? WHERE path = ?", (st.st_mtime, st.st_size, path))
+                        return -1
+                    self._drop(path)
+                    n = 0
+                    for start, end, line in _chunks(mm):
+                        tf = Counter(terms(mm[start:end].decode("utf-8", errors="ignore")))
+                        cur = self.db.execute(
+                            "INSERT INTO chunks (path, start, end, line, nterms) VALUES (?, ?, ?, ?, ?)",
+                            (path, start, end, line, sum(tf.values())))
+                        cid = cur.lastrowid
+                        self.db.executemany("INSERT INTO postings VALUES (?, ?, ?)", ((t, cid, c) for t, c in tf.items()))
+                        n += 1
+                    self.db.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (path, st.st_mtime, st.st_size, sha))
+                    return n
+                finally:
+                    if isinstance(mm, mmap.mmap):
+                        mm.close()
+        except OSError:
+            return None
+
+    # ---- search -------------------------------------------------------------------
+    def search(self, query, roots, k=8):
+        # BM25 over the chunks under roots -> [{"path", "line", "text", "score"}], best first
+        q = list(dict.fromkeys(terms(query)))
+        if not q or not roots:
+            return []
+        roots = [os.path.abspath(r) for r in roots]
+        where, args = _scope(roots)
+        n, avg = self.db.execute(f"SELECT count(*), avg(nterms) FROM chunks c WHERE {where}", args).fetchone()
+        if not n:
+            return []
+        avg = avg or 1.0
+        scores = {}
+        for t in q:
+            rows = self.db.execute(
+                f"SELECT p.chunk, p.tf, c.nterms FROM postings p JOIN chunks c ON c.id = p.chunk "
+                f"WHERE p.term = ? AND {where}", [t] + args).fetchall()
+            if not rows:
+                continue
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for cid, tf, dl in rows:
+                scores[cid] = scores.get(cid, 0.0) + idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avg))
+        best = sorted(scores.items(), key=lambda kv: -kv[1])[:k]
+        hits = []
+        for cid, score in best:
+            path, start, end, line = self.db.execute(
+                "SELECT path, start, end, line FROM chunks WHERE id = ?", (cid,)).fetchone()
+            text = self._read(path, start, end)
+            if text is not None:
+                hits.append({"path": path, "line": line, "text": text, "score": round(score, 3)})
+        return hits
+
+    def _read(self, path, start, end):
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[start:end].decode("utf-8", errors="ignore")
+        except (OSError, ValueError):
+            return None  # file changed or vanished since indexing; next update() fixes it
+
+    def summary(self, root):
+        root = os.path.abspath(root)
+        where, args = _scope([root])
+        files = self.db.execute(
+            f"SELECT count(*), coalesce(sum(size), 0) FROM files c WHERE sha != '{BINARY}' AND {where}", args).fetchone()
+        chunks = self.db.execute(f"SELECT count(*) FROM chunks c WHERE {where}", args).fetchone()[0]
+        return {"files": files[0], "bytes": files[1], "chunks": chunks}
@@ -0,0 +1,265 @@
+# sessions.py — append-only REPL session logs with tail-only resume
+# One file per session: a magic header, then records framed as
+#   <u32 length><compact JSON><u32 length>
+# so the log can be walked from either end. Turns are appended as they happen; a small
+# "state" record (system prompt, attached paths, indexed roots, /clear mark) is appended
+# whenever that state changes. Resume reads the latest state record by offset and walks
+# back over just as many turns as fit the prompt budget, so its cost does not grow with
+# the session. A sqlite index (one row per session) serves listing and search.
+# Transcripts are private: the directory is 0700, logs and the index 0600.
+
+import json
+import os
+import sqlite3
+import struct
+import time
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gpt-hud", "sessions")
+MAGIC = b"GHS1"
+PROMPTS_MAX = 20000  # chars of user prompts kept per session for searching
+
+_LEN = struct.Struct(">I")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, created REAL, updated REAL, cwd TEXT, model TEXT,
+                                     title TEXT, turns INTEGER, tokens INTEGER, cost REAL, bytes INTEGER,
+                                     state_at INTEGER, prompts TEXT);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);
+"""
+
+
+def _private(path, flags):
+    # os.open opener: files we create are 0600 whatever the umask
+    return os.open(path, flags, 0o600)
+
+
+class CorruptLog(Exception):
+    pass
+
+
+def _frame(ob):
+    payload = json.dumps(ob, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    n = _LEN.pack(len(payload))
+    return n + payload + n
+
+
+def _read_at(f, pos):
+    # -> (record, end offset) of the record starting at pos
+    f.seek(pos)
+    head = f.read(4)
+    if len(head) < 4:
+        raise CorruptLog(f"truncated header at {pos}")
+    (n,) = _LEN.unpack(head)
+    body = f.read(n + 4)
+    if len(body) < n + 4 or body[n:] != head:
+        raise CorruptLog(f"torn record at {pos}")
+    return json.loads(body[:n]), pos + 8 + n
+
+
+def _reverse(f, end):
+    # -> (offset, record), newest first
+    pos = end
+    while pos > len(MAGIC):
+        f.seek(pos - 4)
+        (n,) = _LEN.unpack(f.read(4))
+        start = pos - 8 - n
+        if start < len(MAGIC):
+            raise CorruptLog(f"bad trailer before {pos}")
+        rec, _ = _read_at(f, start)
+        yield start, rec
+        pos = start
+
+
+def _valid_end(f, hint=None):
+    # end of the last complete record; a crash mid-append leaves a torn tail behind
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size <= len(MAGIC):
+        return len(MAGIC)
+    f.seek(size - 4)
+    (n,) = _LEN.unpack(f.read(4))
+    start = size - 8 - n
+    if start >= len(MAGIC):
+        try:
+            _read_at(f, start)
+            return size
+        except (CorruptLog, ValueError):
+            pass
+    pos = hint if hint and hint < size else len(MAGIC)  # rare: scan forward from a known-good record
+    while True:
+        try:
+            _, nxt = _read_at(f, pos)
+        except (CorruptLog, ValueError):
+            return pos
+        pos = nxt
+
+
+class SessionLog:
+    # writer for one session; the file (and its index row) appear with the first record
+    def __init__(self, store, sid, meta=None):
+        self.store = store
+        self.id = sid
+        self.path = store.path(sid)
+        self.meta = meta or {}
+        self.turns = 0
+        self._f = None
+
+    def _open(self):
+        if self._f is not None:
+            return
+        fresh = not os.path.exists(self.path)
+        self._f = open(self.path, "ab" if fresh else "r+b", opener=_private)
+        if fresh:
+            self._f.write(MAGIC)
+            self._write({"k": "meta", "id": self.id, "created": time.time(), **self.meta})
+            self.store._insert(self.id, self.meta)
+        else:
+            end = _valid_end(self._f, self.store._row(self.id).get("state_at"))
+            self._f.truncate(end)
+            self._f.seek(end)
+
+    def _write(self, ob):
+        data = _frame(ob)
+        pos = self._f.seek(0, os.SEEK_END)
+        self._f.write(data)
+        self._f.flush()
+        return pos
+
+    def turn(self, user, assistant, usage=None):
+        # usage: (model, pt, ct, cached, total, latency, cost)
+        self._open()
+        self.turns += 1
+        pos = self._write({"k": "turn", "n": self.turns, "t": time.time(), "user": user,
+                           "assistant": assistant, "usage": list(usage) if usage else None})
+        tokens = (usage[4] or 0) if usage else 0
+        cost = (usage[6] or 0.0) if usage else 0.0
+        self.store._on_turn(self.id, self.turns, user, tokens, cost)
+        return pos
+
+    def state(self, **state):
+        # system, attachments [{path, abs}], indexed [roots], base (turns before the last /clear)
+        self._open()
+        pos = self._write({"k": "state", "t": time.time(), **state})
+        self.store._on_state(self.id, pos)
+        return pos
+
+    def sync(self):
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+class SessionStore:
+    def __init__(self, root=None):
+        self.root = os.path.expanduser(root or DEFAULT_DIR)
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        os.chmod(self.root, 0o700)  # also tighten a directory made by an older version
+        db = os.path.join(self.root, "index.sqlite")
+        os.close(_private(db, os.O_RDWR | os.O_CREAT))  # sqlite gives -wal / -shm the same mode
+        self.db = sqlite3.connect(db, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def path(self, sid):
+        return os.path.join(self.root, f"{sid}.log")
+
+    def new(self, sid, **meta):
+        return SessionLog(self, sid, meta)
+
+    def open(self, sid):
+        # append to an existing session (after load())
+        log = SessionLog(self, sid)
+        log.turns = self._row(sid).get("turns") or 0
+        return log
+
+    # ---- index ----------------------------------------------------------------
+    def _row(self, sid):
+        cur = self.db.execute("SELECT * FROM sessions WHERE id = ?", (sid,))
+        row = cur.fetchone()
+        return dict(zip([c[0] for c in cur.description], row)) if row else {}
+
+    def _insert(self, sid, meta):
+        now = time.time()
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?, ?, '', 0, 0, 0.0, 0, NULL, '')",
+                            (sid, now, now, meta.get("cwd"), meta.get("model")))
+
+    def _on_turn(self, sid, n, user, tokens, cost):
+        with self.db:
+            self.db.execute(
+                "UPDATE sessions SET updated = ?, turns = ?, tokens = tokens + ?, cost = cost + ?, bytes = ?,"
+                " title = CASE WHEN title = '' THEN ? ELSE title END,"
+                " prompts = CASE WHEN length(prompts) < ? THEN prompts || ? ELSE prompts END WHERE id = ?",
+                (time.time(), n, tokens, cost, os.path.getsize(self.path(sid)), " ".join(user.split())[:80],
+                 PROMPTS_MAX, user[:2000] + "\n", sid),
+            )
+
+    def _on_state(self, sid, pos):
+        with self.db:
+            self.db.execute("UPDATE sessions SET updated = ?, state_at = ? WHERE id = ?", (time.time(), pos, sid))
+
+    def resolve(self, ref):
+        # "last", a full id or a unique id prefix -> id, or None
+        if ref in (None, "", "last"):
+            row = self.db.execute("SELECT id FROM sessions ORDER BY updated DESC LIMIT 1").fetchone()
+            return row[0] if row else None
+        rows = self.db.execute("SELECT id FROM sessions WHERE id LIKE ? || '%' LIMIT 2", (ref,)).fetchall()
+        return rows[0][0] if len(rows) == 1 else None
+
+    def list(self, query=None, limit=20):
+        # newest first; query matches the title, the user prompts or the working directory
+        sql = "SELECT id, updated, cwd, model, title, turns, tokens, cost, bytes FROM sessions"
+        args = []
+        if query:
+            sql += " WHERE title LIKE ? OR prompts LIKE ? OR cwd LIKE ?"
+            args = [f"%{query}%"] * 3
+        sql += " ORDER BY updated DESC LIMIT ?"
+        cur = self.db.execute(sql, args + [limit])
+        cols = [c[0] for c in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    # ---- resume ---------------------------------------------------------------
+    def load(self, sid, budget, count):
+        # -> (state dict, [turn records] oldest first). Reads the latest state record and
+        # only the newest turns whose messages fit `budget` tokens (count(message) -> tokens).
+        row = self._row(sid)
+        state = {}
+        turns = []
+        used = 0
+        full = False
+        with open(self.path(sid), "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise CorruptLog(f"{sid}: not a session log")
+            state_at = row.get("state_at")
+            end = _valid_end(f, state_at)
+            if state_at is not None and state_at < end:
+                state, _ = _read_at(f, state_at)
+            # without an index row we cannot know whether an older state record exists
+            settled = bool(state) or bool(row)
+            for _, rec in _reverse(f, end):
+                kind = rec.get("k")
+                if kind == "state" and not state:
+                    state, settled = rec, True  # the newest state record wins
+                elif kind == "turn" and not full:
+                    if rec["n"] <= state.get("base", 0):
+                        full = True  # before the last /clear
+                    else:
+                        cost = count({"role": "user", "content": rec["user"]}) + count({"role": "assistant", "content": rec["assistant"]})
+                        if used + cost > budget:
+                            full = True
+                        else:
+                            used += cost
+                            turns.append(rec)
+                if full and settled:
+                    break
+        base = state.get("base", 0)
+        turns = [t for t in reversed(turns) if t["n"] > base]
+        return state, turns
+
+    def close(self):
+        self.db.close()
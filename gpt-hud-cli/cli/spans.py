@@ -0,0 +1,173 @@
+# spans.py — phase tracing (--trace out.json) and the --profile hot-function summary
+# span(name, **args) is a context manager timing one phase. While tracing is off it
+# returns a shared no-op object, so an instrumented call site costs a global lookup, a
+# call and one test. With tracing on, each span is appended to a list (list.append is
+# atomic, so any thread can record) as a Chrome trace event; write() saves them for
+# chrome://tracing or ui.perfetto.dev. Spans carry their thread, so the MCP loop, the
+# render thread and tool workers get their own rows. Overlapping work on one thread
+# (concurrent JSON-RPC requests on the MCP event loop) is recorded as async events.
+
+import cProfile
+import itertools
+import json
+import os
+import pstats
+import sysconfig
+import threading
+import time
+
+_events = None  # list of trace events while tracing, else None
+_threads = {}  # trace thread id -> name, for the metadata rows
+_local = threading.local()
+_ids = itertools.count(1)
+_clock = time.perf_counter
+
+
+def _us(t):
+    return round(t * 1e6, 1)
+
+
+def _tid():
+    # own ids rather than threading.get_ident(): idents are reused once a thread exits
+    try:
+        return _local.tid
+    except AttributeError:
+        tid = _local.tid = next(_ids)
+        _threads[tid] = threading.current_thread().name
+        return tid
+
+
+class _Null:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL = _Null()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "t0")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = _clock()
+        return self
+
+    def __exit__(self, kind, exc, tb):
+        if kind is not None:
+            self.args["error"] = kind.__name__
+        record(self.name, self.t0, _clock(), cat=self.cat, **self.args)
+        return False
+
+    def set(self, **args):
+        # attach results known only at the end of the span (status, sizes, counts)
+        self.args.update(args)
+
+
+def enabled():
+    return _events is not None
+
+
+def start():
+    global _events
+    if _events is None:
+        _events = []
+
+
+def span(name, cat="cli", **args):
+    return _NULL if _events is None else _Span(name, cat, args)
+
+
+def record(name, t0, t1=None, cat="cli", async_id=None, **args):
+    # a span measured elsewhere (perf_counter seconds); async_id makes it an async event,
+    # for work that overlaps other spans on the same thread
+    events = _events
+    if events is None:
+        return
+    t1 = _clock() if t1 is None else t1
+    ev = {"name": name, "cat": cat, "pid": os.getpid(), "tid": _tid()}
+    if args:
+        ev["args"] = args
+    if async_id is None:
+        ev.update(ph="X", ts=_us(t0), dur=_us(t1 - t0))
+        events.append(ev)
+    else:
+        events.append({**ev, "ph": "b", "ts": _us(t0), "id": f"{cat}:{async_id}"})
+        events.append({**ev, "ph": "e", "ts": _us(t1), "id": f"{cat}:{async_id}"})
+
+
+def iter_spans(it, name, cat="cli"):
+    # each next() of `it` as a span (e.g. waiting on the network for the next chunk);
+    # `it` itself when tracing is off
+    return it if _events is None else _timed(iter(it), name, cat)
+
+
+def _timed(it, name, cat):
+    while True:
+        t0 = _clock()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        record(name, t0, cat=cat)
+        yield item
+
+
+def write(path):
+    # -> number of events written
+    events = list(_events or ())
+    pid = os.getpid()
+    meta = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "gpt-hud"}}]
+    meta += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+             for tid, name in list(_threads.items())]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, f, separators=(",", ":"))
+    return len(events)
+
+
+# ---- profiling -----------------------------------------------------------------
+class Profile:
+    # cProfile around a block (the calling thread only; other threads show up in --trace)
+    def __init__(self):
+        self.prof = cProfile.Profile()
+
+    def __enter__(self):
+        self.prof.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.prof.disable()
+        return False
+
+    def top(self, n=25, root=None):
+        # -> [(function, calls, self seconds, cumulative seconds)], most self time first;
+        # paths are shown relative to `root`, site-packages or the stdlib
+        prefixes = [p for p in (root, sysconfig.get_path("purelib"), sysconfig.get_path("platlib"),
+                                sysconfig.get_path("stdlib")) if p]
+        rows = []
+        for (path, line, func), (_, calls, tt, ct, _) in pstats.Stats(self.prof).stats.items():
+            if path == "~":
+                where = func  # built-in, e.g. "<method 'recv_into' of '_socket.socket' objects>"
+            else:
+                for p in prefixes:
+                    if path.startswith(p + os.sep):
+                        path = path[len(p) + 1:]
+                        break
+                where = f"{func} ({path}:{line})"
+            rows.append((where, calls, tt, ct))
+        rows.sort(key=lambda r: r[2], reverse=True)
+        return rows[:n]
+
@@ -0,0 +1,246 @@
+# sse.py — incremental Server-Sent Events decoder for chat completion streams
+# Works on raw byte chunks (no per-line decode/strip), follows the SSE spec
+# (multi-line data, event:/id:/retry:, CRLF/CR/LF line endings, comments) and turns
+# each data payload into typed chat events. Nothing is swallowed silently: bad or
+# ignored events are counted in decoder.stats.
+
+import json
+from collections import namedtuple
+from functools import partial
+
+Delta = namedtuple("Delta", "text index")
+Usage = namedtuple("Usage", "usage")
+Finish = namedtuple("Finish", "reason index")
+ToolCallDelta = namedtuple("ToolCallDelta", "index id name arguments")  # one fragment of a streamed tool call
+StreamError = namedtuple("StreamError", "error")
+Done = namedtuple("Done", "")
+
+_DONE = Done()
+# C-level constructors / scanner: skip the Python frames of namedtuple.__new__ and json.loads
+_delta = partial(tuple.__new__, Delta)
+_scan = json.JSONDecoder().scan_once
+
+try:
+    import orjson  # optional: parses bytes directly, ~2x faster than the stdlib scanner
+except Exception:
+    orjson = None
+
+
+def _parse(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return _scan(data.decode("utf-8"), 0)[0]
+
+
+class SSEDecoder:
+    # spec-level parser: bytes in, (event, data, id) tuples out
+    def __init__(self):
+        self._tail = []  # bytes of the current, still unterminated line
+        self._cr = False  # last chunk ended on CR: may be the first half of a CRLF
+        self._data = []
+        self._event = None
+        self.last_id = None
+        self.retry = None
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+        if self._cr:
+            self._cr = False
+            chunk = b"\n" + (chunk[1:] if chunk[:1] == b"\n" else chunk)
+        if b"\r" in chunk:
+            if chunk[-1:] == b"\r":
+                chunk = chunk[:-1]
+                self._cr = True
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        nl = chunk.find(b"\n")
+        if nl < 0:
+            self._tail.append(chunk)  # no copy until the line is complete
+            return []
+        if self._tail:
+            self._tail.append(chunk)
+            chunk = b"".join(self._tail)
+            self._tail = []
+        lines = chunk.split(b"\n")  # C-speed split; one slice per line is all json.loads needs
+        rest = lines.pop()
+        if rest:
+            self._tail.append(rest)
+        return self._lines(lines)
+
+    def close(self):
+        lines = []
+        if self._tail:
+            lines.append(b"".join(self._tail))
+            self._tail = []
+        self._cr = False
+        lines.append(b"")  # a trailing event without its blank line is still dispatched
+        return self._lines(lines)
+
+    def _lines(self, lines):
+        out = []
+        data = self._data
+        for line in lines:
+            if line:
+                if line[:6] == b"data: ":
+                    data.append(line[6:])
+                else:
+                    self._field(line)
+            elif data:
+                out.append((self._event or "message", data[0] if len(data) == 1 else b"\n".join(data), self.last_id))
+                data = self._data = []
+                self._event = None
+            else:
+                self._event = None
+        return out
+
+    def _field(self, line):
+        if line[:1] == b":":  # comment / keep-alive
+            return
+        field, sep, value = line.partition(b":")
+        if value[:1] == b" ":
+            value = value[1:]
+        if field == b"data":
+            self._data.append(value)
+        elif field == b"event":
+            self._event = value.decode("utf-8", "replace")
+        elif field == b"id":
+            if b"\0" not in value:
+                self.last_id = value.decode("utf-8", "replace")
+        elif field == b"retry":
+            if value.isdigit():
+                self.retry = int(value)
+
+
+class ChatStreamDecoder:
+    # chat-level decoder: SSE data payloads -> Delta / Usage / Finish / StreamError / Done
+    def __init__(self):
+        self.sse = SSEDecoder()
+        self.stats = {"events": 0, "bad": 0, "ignored": 0}
+        self.done = False
+        self.feed_raw = self.sse.feed
+
+    def feed(self, chunk):
+        # fast path: providers flush one complete "data: {...}\n\n" event per HTTP chunk,
+        # and nearly all of them are a single plain content delta
+        if (
+            chunk[:6] == b"data: "
+            and chunk.find(b"\n", 6) == len(chunk) - 2
+            and chunk[-1:] == b"\n"
+            and b"\r" not in chunk
+            and not (self.done or self._sse_busy())
+        ):
+            self.stats["events"] += 1
+            data = chunk[6:-2]
+            try:
+                ob = orjson.loads(data) if orjson is not None else _scan(data.decode("utf-8"), 0)[0]
+                ch = ob["choices"]
+                if len(ch) == 1 and "usage" not in ob:
+                    ch = ch[0]
+                    text = ch["delta"]["content"]
+                    if text and ch.get("finish_reason") is None:
+                        return [_delta((text, ch.get("index", 0)))]
+            except Exception:
+                pass  # anything unusual goes through the general path below
+            out = []
+            self._payload("message", data, out)
+            return out
+        return self._decode(self.feed_raw(chunk))
+
+    def _sse_busy(self):
+        sse = self.sse
+        return bool(sse._tail or sse._data or sse._cr)
+
+    def close(self):
+        return self._decode(self.sse.close())
+
+    def _decode(self, raw_events):
+        out = []
+        if raw_events:
+            self.stats["events"] += len(raw_events)
+            for event, data, _id in raw_events:
+                self._payload(event, data, out)
+        return out
+
+    def _payload(self, event, data, out):
+        stats = self.stats
+        if self.done:
+            stats["ignored"] += 1
+            return
+        if data == b"[DONE]":
+            self.done = True
+            out.append(_DONE)
+            return
+        try:
+            ob = _parse(data)
+        except (StopIteration, ValueError):
+            stats["bad"] += 1
+            return
+        if type(ob) is not dict:
+            stats["bad"] += 1
+            return
+        if event == "error" or "error" in ob:
+            out.append(StreamError(ob.get("error", ob)))
+            return
+        n = len(out)
+        for ch in ob.get("choices") or ():
+            delta = ch.get("delta")
+            if delta:
+                text = delta.get("content")
+                if text:
+                    out.append(_delta((text, ch.get("index", 0))))
+                for tc in delta.get("tool_calls") or ():
+                    fn = tc.get("function") or {}
+                    out.append(ToolCallDelta(tc.get("index", 0), tc.get("id"), fn.get("name"), fn.get("arguments") or ""))
+            reason = ch.get("finish_reason")
+            if reason:
+                out.append(Finish(reason, ch.get("index", 0)))
+        usage = ob.get("usage")
+        if usage:
+            out.append(Usage(usage))
+        if len(out) == n:
+            stats["ignored"] += 1  # e.g. role-only first chunk, Azure prompt_filter_results
+
+    def iter_response(self, r):
+        for chunk in iter_chunks(r):
+            yield from self.feed(chunk)
+            if self.done:
+                return
+        yield from self.close()
+
+
+class ToolCallAssembler:
+    # Collects ToolCallDelta fragments: the first fragment of a call carries its id and
+    # name, the following ones only pieces of the JSON arguments string.
+    def __init__(self):
+        self._calls = {}
+
+    def add(self, ev):
+        c = self._calls.get(ev.index)
+        if c is None:
+            c = self._calls[ev.index] = {"id": None, "name": "", "arguments": []}
+        if ev.id:
+            c["id"] = ev.id
+        if ev.name and not c["name"]:
+            c["name"] = ev.name
+        if ev.arguments:
+            c["arguments"].append(ev.arguments)
+
+    def __bool__(self):
+        return bool(self._calls)
+
+    def calls(self):
+        # -> [{"id", "name", "arguments"}] in the order the model listed them
+        return [{"id": c["id"] or f"call_{i}", "name": c["name"], "arguments": "".join(c["arguments"])}
+                for i, c in sorted(self._calls.items())]
+
+
+def iter_chunks(r):
+    # urllib3 yields each HTTP chunk as it lands on a chunked body, so read it directly
+    # (one generator layer less than iter_content); a plain body would block until EOF
+    # with amt=None, so read small pieces instead
+    raw = getattr(r, "raw", None)
+    if raw is None:
+        return r.iter_content(chunk_size=None)  # httpx adapter, cached replay
+    if getattr(raw, "chunked", False) and hasattr(raw, "stream"):
+        return raw.stream(None, decode_content=True)
+    return r.iter_content(chunk_size=1024)
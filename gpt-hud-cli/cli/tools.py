@@ -0,0 +1,116 @@
+# tools.py — MCP tools offered to the model as OpenAI function tools
+# MCP tool names may contain characters function names can't ("browser.navigate"), so
+# each tool gets a sanitized, unique function name and calls are mapped back. Calls the
+# model makes in one turn run concurrently, each with its own timeout, and every result
+# is flattened to text and capped before it goes back into the conversation.
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+_BAD = re.compile(r"[^A-Za-z0-9_-]")
+NAME_MAX = 64  # OpenAI: ^[a-zA-Z0-9_-]{1,64}$
+
+
+def function_name(name, taken):
+    fn = _BAD.sub("_", name or "tool")[:NAME_MAX] or "tool"
+    base, n = fn, 2
+    while fn in taken:
+        suffix = f"_{n}"
+        fn = base[:NAME_MAX - len(suffix)] + suffix
+        n += 1
+    return fn
+
+
+class ToolSet:
+    def __init__(self, tools):
+        # tools: MCP tool dicts ({"name", "description", "inputSchema"})
+        self.names = {}  # function name -> MCP tool name
+        self.specs = []
+        for t in tools or ():
+            fn = function_name(t.get("name"), self.names)
+            self.names[fn] = t.get("name")
+            schema = t.get("inputSchema") or {}
+            if schema.get("type") != "object":
+                schema = {"type": "object", "properties": {}}
+            self.specs.append({"type": "function", "function": {
+                "name": fn, "description": (t.get("description") or "")[:1024], "parameters": schema}})
+
+    def __bool__(self):
+        return bool(self.specs)
+
+    def resolve(self, fn):
+        return self.names.get(fn)
+
+
+def resource_path(item):
+    # local file behind a {"type": "resource"} content item (file:// URI), or None. Servers
+    # hand large binaries (screenshots) over this way instead of base64 in the frame.
+    uri = (item.get("resource") or {}).get("uri") or ""
+    if not uri.startswith("file://"):
+        return None
+    path = unquote(urlparse(uri).path)
+    return path if os.path.isfile(path) else None
+
+
+def result_text(res, limit):
+    # MCP tools/call result -> text for a role=tool message, at most `limit` chars
+    if isinstance(res, dict) and isinstance(res.get("content"), list):
+        parts = []
+        for c in res["content"]:
+            kind = c.get("type")
+            if kind == "text":
+                parts.append(c.get("text", ""))
+            elif kind == "resource":
+                r = c.get("resource") or {}
+                path = resource_path(c)
+                if r.get("text"):
+                    parts.append(r["text"])
+                elif path:
+                    parts.append(f"[{r.get('mimeType') or 'file'} at {path}, {os.path.getsize(path)} bytes]")
+                else:
+                    parts.append(f"[resource {r.get('uri', '?')}]")
+            else:
+                size = len(c.get("data") or "") * 3 // 4
+                parts.append(f"[{kind} {c.get('mimeType', '')} omitted, {size} bytes]")
+        text = "\n".join(parts)
+        if res.get("isError"):
+            text = "Error: " + text
+    else:
+        text = res if isinstance(res, str) else json.dumps(res, ensure_ascii=False)
+    if len(text) > limit:
+        text = text[:limit] + f"\n… [truncated {len(text) - limit} chars]"
+    return text
+
+
+def run_calls(call, toolset, calls, timeout=30.0, limit=20000, workers=4):
+    # call(mcp_name, arguments, timeout) -> MCP result. calls: assembled tool calls.
+    # -> [{"id", "name", "content", "latency", "ok"}] in call order; failures become
+    # error text for the model instead of exceptions.
+    def one(c):
+        t0 = time.perf_counter()
+        name = toolset.resolve(c["name"])
+        ok = False
+        try:
+            if name is None:
+                raise LookupError(f"unknown tool {c['name']!r}")
+            try:
+                args = json.loads(c["arguments"] or "{}")
+            except ValueError as e:
+                raise ValueError(f"arguments are not valid JSON ({e})")
+            content = result_text(call(name, args, timeout), limit)
+            ok = not content.startswith("Error: ")
+        except TimeoutError:
+            content = f"Error: tool timed out after {timeout:g}s"
+        except Exception as e:
+            content = f"Error: {e}"
+        return {"id": c["id"], "name": name or c["name"], "content": content,
+                "latency": time.perf_counter() - t0, "ok": ok}
+
+    if len(calls) == 1:
+        return [one(calls[0])]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(calls)))) as pool:
+        return list(pool.map(one, calls))
@@ -0,0 +1,218 @@
+# transport.py — long-lived pooled HTTP transport shared by repl() and run_once()
+# One Session (or httpx.Client when HTTP/2 is on) per process, so every turn reuses
+# the same TCP/TLS connection instead of paying a fresh handshake.
+# httpx transport errors are re-raised as their requests counterparts (ConnectionError /
+# Timeout), so failover and retries behave the same on either client.
+
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sse import iter_chunks
+
+try:
+    import httpx  # optional: HTTP2=1 (pip install "httpx[http2]")
+except Exception:
+    httpx = None
+
+
+def _requests_error(e):
+    # httpx transport error -> the requests exception that failover / retries catch
+    if isinstance(e, httpx.ConnectTimeout):
+        return requests.ConnectTimeout(str(e))
+    if isinstance(e, httpx.TimeoutException):
+        return requests.Timeout(str(e))
+    return requests.ConnectionError(str(e))
+
+
+def _origin(url):
+    u = urlsplit(url)
+    return f"{u.scheme}://{u.netloc}"
+
+
+class _HTTPXResponse:
+    # requests.Response look-alike so callers don't care which client served the call
+    def __init__(self, r):
+        self._r = r
+        self.status_code = r.status_code
+        self.headers = r.headers
+
+    @property
+    def text(self):
+        self._r.read()
+        return self._r.text
+
+    def json(self):
+        self._r.read()
+        return self._r.json()
+
+    def iter_content(self, chunk_size=None):
+        try:
+            yield from self._r.iter_bytes(chunk_size)
+        except httpx.TransportError as e:
+            raise _requests_error(e) from e
+
+    def iter_lines(self):
+        for line in self._r.iter_lines():
+            yield line.encode("utf-8")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for url: {self._r.url}", response=self)
+
+    def close(self):
+        self._r.close()
+
+
+async def aiter_thread(open_response):
+    # Async byte stream of a blocking response: open_response() -> response is called
+    # and its body read in a worker thread, chunks are handed to the event loop.
+    loop = asyncio.get_running_loop()
+    q = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(q.put_nowait, item)
+        except RuntimeError:  # the loop is gone: nobody is listening any more
+            stop.set()
+
+    def pump():
+        try:
+            r = open_response()
+            try:
+                for chunk in iter_chunks(r):
+                    if stop.is_set():
+                        break
+                    put(chunk)
+            finally:
+                r.close()
+        except BaseException as e:
+            put(e)
+        finally:
+            put(None)
+
+    threading.Thread(target=pump, daemon=True).start()
+    try:
+        while True:
+            item = await q.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class Transport:
+    def __init__(self, pool_size=4, keepalive=90.0, http2=False):
+        self.pool_size = max(1, int(pool_size))
+        self.keepalive = float(keepalive)  # idle seconds before we drop pooled sockets; 0 = no keep-alive
+        self.http2 = bool(http2)
+        self._lock = threading.Lock()
+        self._session = None
+        self._client = None
+        self._last_used = 0.0
+        self._warming = {}  # origin -> Event, set once the warm-up request finished
+
+    def _get_client(self):
+        if self._client is None and self.http2 and httpx is not None:
+            try:
+                limits = httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size if self.keepalive > 0 else 0,
+                    keepalive_expiry=self.keepalive or None,
+                )
+                self._client = httpx.Client(http2=True, limits=limits, timeout=None)
+            except Exception:
+                self.http2 = False  # h2 extra missing -> stay on requests
+        return self._client
+
+    def _get_session(self):
+        if self._session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            if self.keepalive <= 0:
+                s.headers["Connection"] = "close"
+            self._session = s
+        elif self.keepalive > 0 and self._last_used and time.monotonic() - self._last_used > self.keepalive:
+            # servers drop idle sockets; reconnect up front instead of failing on a dead one
+            for adapter in self._session.adapters.values():
+                adapter.close()
+        return self._session
+
+    def _touch(self):
+        self._last_used = time.monotonic()
+
+    def _wait_warm(self, url, timeout=5.0):
+        ev = self._warming.get(_origin(url))
+        if ev is not None:
+            ev.wait(timeout)
+
+    def post(self, url, headers=None, json=None, stream=False, timeout=300):
+        self._wait_warm(url)
+        with self._lock:
+            client = self._get_client()
+            session = None if client is not None else self._get_session()
+            self._touch()
+        if client is not None:
+            req = client.build_request("POST", url, headers=headers, json=json, timeout=timeout)
+            try:
+                return _HTTPXResponse(client.send(req, stream=stream))
+            except httpx.TransportError as e:
+                raise _requests_error(e) from e
+        return session.post(url, headers=headers, json=json, stream=stream, timeout=timeout)
+
+    def get(self, url, timeout=10, **kw):
+        with self._lock:
+            client = self._get_client()
+            session = None if client is not None else self._get_session()
+            self._touch()
+        if client is not None:
+            try:
+                return _HTTPXResponse(client.get(url, timeout=timeout, **kw))
+            except httpx.TransportError as e:
+                raise _requests_error(e) from e
+        return session.get(url, timeout=timeout, **kw)
+
+    def prewarm(self, url, timeout=5.0):
+        # Open the connection in the background (e.g. while the banner renders).
+        # Any response — even 404 — leaves a warm socket in the pool.
+        origin = _origin(url)
+        with self._lock:
+            if origin in self._warming:
+                return
+            ev = self._warming[origin] = threading.Event()
+
+        def _warm():
+            try:
+                with self._lock:
+                    client = self._get_client()
+                    session = None if client is not None else self._get_session()
+                    self._touch()
+                if client is not None:
+                    client.head(origin + "/", timeout=timeout)
+                else:
+                    session.head(origin + "/", timeout=timeout, allow_redirects=False).close()
+            except Exception:
+                pass
+            finally:
+                ev.set()
+
+        threading.Thread(target=_warm, daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._client is not None:
+                self._client.close()
+                self._client = None
@@ -1,42 +1,167 @@
 // Simple Playwright MCP (stdio) with a /health probe to stderr only
+// One warm Chromium per process; every call gets a fresh context (one page) that is closed
+// afterwards, so no state leaks between calls. A spare context is opened ahead of time to keep
+// newContext() off the call path; the spare and finally the browser are closed when idle.
 import { createServer } from "@modelcontextprotocol/sdk/server/index.js";
 import { StdioServerTransport } from "@modelcontextprotocol/sdk/server/stdio.js";
 import http from "node:http";
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
 import { chromium } from "playwright";
 
 const HEALTH_PORT = Number(process.env.MCP_HEALTH_PORT || 8931);
+const MAX_CONTEXTS = Math.max(1, Number(process.env.PW_MAX_CONTEXTS || 4)); // concurrent calls (one context each)
+const CONTEXT_IDLE_MS = Number(process.env.PW_CONTEXT_IDLE_MS || 60_000); // close the spare context unused this long
+const BROWSER_IDLE_MS = Number(process.env.PW_BROWSER_IDLE_MS || 300_000); // close Chromium when idle this long
+const NAV_TIMEOUT_MS = Number(process.env.PW_NAV_TIMEOUT_MS || 30_000);
+const INLINE_MAX = Number(process.env.PW_SCREENSHOT_INLINE_MAX || 256 * 1024); // larger screenshots go to a file
+const SHOT_TTL_MS = 3_600_000; // screenshot files are removed after an hour
+const SHOT_DIR = fs.mkdtempSync(path.join(os.tmpdir(), "gpt-hud-screenshots-")); // fresh and 0700: ours alone
+
+// ---- Browser + context slots -----------------------------------------------
+let browser = null; // Promise<Browser>
+let gen = 0; // browser generation: bumped when Chromium goes away, so stale slots don't touch the counts
+let lastUsed = Date.now();
+const spare = []; // { context, page, since, gen }: fresh, never-used contexts opened ahead of calls
+const waiters = []; // resolve callbacks waiting for a free slot
+let busy = 0; // calls holding a context (of the current generation)
+const stats = { calls: 0, launches: 0, contexts: 0, prewarmed: 0 };
+
+function getBrowser() {
+  if (!browser) {
+    stats.launches++;
+    browser = chromium.launch().then((b) => {
+      b.on("disconnected", () => { // crashed or idle-closed: start over next call
+        gen++; browser = null; spare.length = 0; busy = 0;
+        while (waiters.length) wake();
+      });
+      return b;
+    }, (e) => { browser = null; throw e; });
+  }
+  return browser;
+}
+
+async function newSlot() {
+  const g = gen;
+  const context = await (await getBrowser()).newContext();
+  const page = await context.newPage();
+  page.setDefaultNavigationTimeout(NAV_TIMEOUT_MS);
+  stats.contexts++;
+  return { context, page, since: Date.now(), gen: g };
+}
+
+function prewarm() {
+  // keep one fresh context ready so the next call doesn't wait for newContext()
+  if (spare.length || !browser) return;
+  newSlot().then((slot) => {
+    if (slot.gen === gen && !spare.length) spare.push(slot); else slot.context.close().catch(() => {});
+  }, () => {});
+}
+
+async function acquire() {
+  lastUsed = Date.now();
+  while (busy >= MAX_CONTEXTS) await new Promise((resolve) => waiters.push(resolve)); // concurrency cap reached
+  const g = gen;
+  busy++;
+  try {
+    const ready = spare.pop();
+    if (ready && ready.gen === gen) { stats.prewarmed++; return ready; }
+    return await newSlot();
+  } catch (e) { if (g === gen) busy--; wake(); throw e; }
+}
+
+function release(slot) {
+  // per-call isolation: the context is thrown away with all of its state (every origin's
+  // storage, IndexedDB, service workers, HTTP cache, cookies); only the browser is reused
+  slot.context.close().catch(() => {});
+  if (slot.gen === gen) busy--;
+  lastUsed = Date.now();
+  wake();
+  prewarm();
+}
+
+function wake() { const w = waiters.shift(); if (w) w(); }
+
+async function withPage(fn) {
+  const slot = await acquire();
+  stats.calls++;
+  try { return await fn(slot.page); } finally { release(slot); }
+}
+
+setInterval(async () => {
+  const now = Date.now();
+  for (let i = spare.length - 1; i >= 0; i--) {
+    if (now - spare[i].since < CONTEXT_IDLE_MS) continue;
+    const [slot] = spare.splice(i, 1);
+    slot.context.close().catch(() => {});
+  }
+  if (browser && busy === 0 && now - lastUsed >= BROWSER_IDLE_MS) {
+    const b = browser; browser = null;
+    (await b).close().catch(() => {});
+  }
+  try {
+    for (const f of fs.readdirSync(SHOT_DIR)) {
+      const p = path.join(SHOT_DIR, f);
+      try { if (now - fs.statSync(p).mtimeMs > SHOT_TTL_MS) fs.unlinkSync(p); } catch {}
+    }
+  } catch {} // directory removed under us: nothing to clean
+}, 10_000).unref();
+
+// ---- Health ------------------------------------------------------------------
 http.createServer((req, res) => {
   if (req.url !== "/health") { res.statusCode = 404; return res.end(); }
   res.setHeader("content-type","application/json");
-  res.end(JSON.stringify({ ok: true, service: "mcp-playwright", time: Date.now() }));
+  res.end(JSON.stringify({ ok: true, service: "mcp-playwright", time: Date.now(), browser: !!browser,
+                           contexts: { busy, spare: spare.length, max: MAX_CONTEXTS }, waiting: waiters.length, ...stats }));
 }).listen(HEALTH_PORT, "127.0.0.1", () => {
   console.error(`[health] http://127.0.0.1:${HEALTH_PORT}/health`);
 });
 process.stdin.resume(); // keep alive
+getBrowser().then(prewarm, (e) => console.error(`[browser] prelaunch failed: ${e.message}`)); // warm before the first call
 
-const server = createServer({ name: "mcp-playwright", version: "0.1.0" }, { capabilities: { tools: {} } });
+// ---- MCP ---------------------------------------------------------------------
+const server = createServer({ name: "mcp-playwright", version: "0.2.0" }, { capabilities: { tools: {} } });
 
 server.setRequestHandler("tools/list", async () => ({
   tools: [
-    { name: "playwright.navigate", description: "Open a URL in headless Chromium", inputSchema: { type: "object", properties: { url: { type: "string" } }, required: ["url"] } },
-    { name: "playwright.screenshot", description: "Screenshot a URL", inputSchema: { type: "object", properties: { url: { type: "string" } }, required: ["url"] } }
+    { name: "playwright.navigate", description: "Open a URL in headless Chromium; returns the final URL, status and title", inputSchema: { type: "object", properties: { url: { type: "string" } }, required: ["url"] } },
+    { name: "playwright.screenshot", description: "Screenshot a URL (PNG). Small images come back inline, large ones as a local file path",
+      inputSchema: { type: "object", properties: { url: { type: "string" }, fullPage: { type: "boolean", default: true },
+                                                   output: { type: "string", enum: ["auto", "image", "file"], default: "auto" } }, required: ["url"] } }
   ]
 }));
 
 server.setRequestHandler("tools/call", async ({ name, arguments: args }) => {
-  if (!args || typeof args.url !== "string") return { content: [{ type: "text", text: "Missing { url }" }] };
-  if (name === "playwright.navigate") {
-    const browser = await chromium.launch(); const page = await browser.newPage();
-    await page.goto(args.url, { waitUntil: "domcontentloaded" }); await browser.close();
-    return { content: [{ type: "text", text: `Navigated to ${args.url}` }] };
-  }
-  if (name === "playwright.screenshot") {
-    const browser = await chromium.launch(); const page = await browser.newPage();
-    await page.goto(args.url, { waitUntil: "domcontentloaded" });
-    const buf = await page.screenshot({ fullPage: true }); await browser.close();
-    return { content: [{ type: "text", text: `Screenshot bytes: ${buf.length}` }] };
+  if (!args || typeof args.url !== "string") return { content: [{ type: "text", text: "Missing { url }" }], isError: true };
+  try {
+    if (name === "playwright.navigate") {
+      return await withPage(async (page) => {
+        const res = await page.goto(args.url, { waitUntil: "domcontentloaded" });
+        return { content: [{ type: "text", text: `Navigated to ${page.url()} (HTTP ${res ? res.status() : "?"}): ${await page.title()}` }] };
+      });
+    }
+    if (name === "playwright.screenshot") {
+      return await withPage(async (page) => {
+        await page.goto(args.url, { waitUntil: "domcontentloaded" });
+        const buf = await page.screenshot({ fullPage: args.fullPage !== false });
+        const output = args.output || "auto";
+        if (output === "image" || (output === "auto" && buf.length <= INLINE_MAX)) {
+          return { content: [{ type: "image", data: buf.toString("base64"), mimeType: "image/png" }] };
+        }
+        // large image: write it next to us and hand back the path instead of MBs of base64
+        const file = path.join(SHOT_DIR, `shot-${process.pid}-${Date.now()}-${Math.random().toString(36).slice(2, 8)}.png`);
+        fs.writeFileSync(file, buf, { mode: 0o600 });
+        return { content: [
+          { type: "resource", resource: { uri: `file://${file}`, mimeType: "image/png" } },
+          { type: "text", text: `Screenshot of ${page.url()} saved to ${file} (${buf.length} bytes)` }
+        ] };
+      });
+    }
+  } catch (e) {
+    return { content: [{ type: "text", text: `${name} failed: ${e.message}` }], isError: true };
   }
-  return { content: [{ type: "text", text: `Unknown tool ${name}` }] };
+  return { content: [{ type: "text", text: `Unknown tool ${name}` }], isError: true };
 });
 
 await server.connect(new StdioServerTransport());